@@ -16,6 +16,9 @@ params.run_ontology = true
 params.obo = ""
 params.association = ""
 params.population = ""
+params.threads = 1
+params.shards = "chrom"
+params.vep_forks = 1
 
 /*FILE SPECIFIED CHECK
 *check if ontologizer files are specified if not make sure to raise a custom
@@ -64,6 +67,9 @@ log.info "Run ontology: ${params.run_ontology}"
 log.info "obo: ${params.obo}"
 log.info "association: ${params.association}"
 log.info "population: ${params.population}"
+log.info "threads: ${params.threads}"
+log.info "shards: ${params.shards}"
+log.info "vep forks: ${params.vep_forks}"
 
 /*
 *FILE AND INPUT CHECK.
@@ -112,7 +118,7 @@ process add_dispersed_insertions{
 	file vcf
 	
 	output:
-	file 'added_vcf.vcf' into added_vcf
+	file 'added_vcf.vcf' into added_vcf, added_vcf_to_split
 	
 	"""
 	add_dispersed_insertions.py \
@@ -156,35 +162,59 @@ if (mode == "custom"){
 }
 
 /*
-*Run vep and depending on the mode use 2 different commands. After running
-*remove the temp dir directory that contains the bgzipped and tabbix file
-*because they had to be located here to be able to find them
+*Split the vcf file into shards so vep can run on them in parallel. With
+*--shards chrom every chromosome gets its own shard, with a number the rows
+*are divided over that many shards of about the same size. A vcf file without
+*rows gives no shards.
+*/
+process split_vcf{
+	input:
+	file input_file from added_vcf_to_split
+	
+	output:
+	file 'shard_*.vcf' optional true into vcf_shards
+	
+	script:
+	if (params.shards == "chrom")
+		"""
+		split_vcf.py --vcf ${input_file} --by_chrom
+		"""
+	else
+		"""
+		split_vcf.py --vcf ${input_file} --shards ${params.shards}
+		"""
+}
+
+/*
+*Run vep on every shard and depending on the mode use 2 different commands.
+*VEP only gets --fork when it should use more then 1 fork.
 */
 process run_vep{
+	cpus params.vep_forks
+	
 	input:
-	file input_file from added_vcf
+	file input_file from vcf_shards.flatten()
 	val species from params.species
 	val cache_version from params.cache_version
 	val cache from params.cache_dir
 	
 	output:
-	file 'vep_output.txt' into vep_result
-	
-	afterScript "rm -r ${output}/temp_dir/"
+	file "${input_file.baseName}_vep.txt" into vep_shard_results
 	
 	script:
+	def fork_option = params.vep_forks > 1 ? "--fork ${task.cpus}" : ""
 	if (mode == "cache")
 		"""
 		vep --cache --offline --numbers --force_overwrite --dir ${cache}\
 		--species ${species} --cache_version ${cache_version}\
-		 -i ${input_file} -o vep_output.txt
+		${fork_option} -i ${input_file} -o ${input_file.baseName}_vep.txt
 		"""
 		
 	else if (mode == "custom")
 		"""
 		vep --numbers --force_overwrite \
 		--gff ${output}/temp_dir/gff_file.gff.gz --fasta ${fasta}\
-		 -i ${input_file} -o vep_output.txt
+		${fork_option} -i ${input_file} -o ${input_file.baseName}_vep.txt
 		"""
 		
 	else
@@ -192,12 +222,33 @@ process run_vep{
 	
 }
 
+/*
+*Merge the vep output of the shards into one file sorted on location. After
+*all shards are done remove the temp dir directory that contains the bgzipped
+*and tabbix file because they had to be located here to be able to find them.
+*Without shards the merged file only gets the column header of vep.
+*/
+process merge_vep{
+	input:
+	file shard_results from vep_shard_results.collect().ifEmpty([])
+	
+	output:
+	file 'vep_output.txt' into vep_result
+	
+	afterScript "rm -r ${output}/temp_dir/"
+	
+	"""
+	merge_vep.py --vep ${shard_results} --output vep_output.txt
+	"""
+}
+
 /*
 *Add some information that is lacking to the vep file for a more complete
 *picture
 */
 process add_info_vep_file{
 	publishDir "${output}"	
+	cpus params.threads
 
 	input:
 	file vep_input_file from vep_result
@@ -209,7 +260,7 @@ process add_info_vep_file{
 	"""
 	correct_vep.py \
 	--vcf ${vcf_input_file} --vep ${vep_input_file} \
-	--output added_vep_output.txt
+	--output added_vep_output.txt --threads ${task.cpus}
 	"""
 }
 
@@ -295,6 +346,30 @@ if (params.run_ontology == true){
         """
     }
 
+    /*
+    *Compile the obo, association and population file into one index that is
+    *published next to the symbolic links, so the dash script does not have to
+    *read them again. Only the dash script uses the index, the steps above
+    *read the files. The dash script remakes the index when the content of
+    *one of the files changed.
+    */
+    process compile_go_index{
+        publishDir "${output}", mode: "copy"
+
+        input:
+        file obo
+        file association
+        file population
+
+        output:
+        file "go_index.npz" into go_index
+
+        """
+        go_enrichment.py --obo ${obo} --association ${association} \
+        --population ${population} --index go_index.npz
+        """
+    }
+
     /*
     *Create a picture using dot if the view file was created by ontologizer
     */
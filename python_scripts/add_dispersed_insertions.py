@@ -18,23 +18,34 @@ def get_arguments():
         description='Add dispersed duplications as insertions to the vcf file so vep takes these into account.')
     parser.add_argument("-vcf", help="Input file in VCF format.", required=True)
     parser.add_argument("-o", "--output", help="Loaction for the output file.", required=True)
+    parser.add_argument("--stream", action="store_true",
+                        help="Process the vcf file one line at a time instead of loading it into memory.")
+    parser.add_argument("--memory", type=int, default=vcfa.DEFAULT_MEMORY_BUDGET // 1024 ** 2,
+                        help="Megabytes of rows to sort in memory when streaming, above this the rows are sorted on "
+                             "disk.")
     return parser.parse_args()
 
 
 class AddDispercedDuplications:
-    def __init__(self, vcf_file, out_file):
+    def __init__(self, vcf_file, out_file, stream=False, memory_budget=vcfa.DEFAULT_MEMORY_BUDGET):
         """
         Class that takes a vcf file and adds dispersed duplications as insertions to the vcf file. This is done to make
         sure vep measures the impact of the dispersed insertions
         :param vcf_file: The input file in vcf format.
         :param out_file: The location and name of the output file.
+        :param stream: Boolean telling if the vcf file should be processed one row at a time.
+        :param memory_budget: Amount of bytes of rows that are sorted in memory when streaming.
         :param vcf_tsv: instance of VcfAnalyser class that holds the file as a dictionary of dictionaries and can be
         manipulated as such.
         """
-        self.vcf_tsv = vcfa.VcfAnalyser(vcf_file, "ID")
-        self.add_disperced_insertions()
-        self.add_to_header()
-        self.vcf_tsv.vcf_to_file(out_file, "INFO")
+        self.vcf_tsv = vcfa.VcfAnalyser(vcf_file, "ID", stream=stream)
+        if stream:
+            self.add_to_header()
+            self.vcf_tsv.sorted_records_to_file(out_file, self.stream_disperced_insertions(), "INFO", memory_budget)
+        else:
+            self.add_disperced_insertions()
+            self.add_to_header()
+            self.vcf_tsv.vcf_to_file(out_file, "INFO")
 
     def add_disperced_insertions(self):
         """
@@ -42,7 +53,7 @@ class AddDispercedDuplications:
         """
         ins_list = []
         for key in self.vcf_tsv.keys():
-            if "SVTYPE=DUP:DISPERSED" in self.vcf_tsv[key]["INFO"]:
+            if self.vcf_tsv[key].svtype == "DUP:DISPERSED":
                 ins_row = self.create_insertion_row(self.vcf_tsv[key])
                 ins_list.append(ins_row)
         # Creating a list of insertions and adding them after making sure the siuze of the dictionary does not change
@@ -50,37 +61,34 @@ class AddDispercedDuplications:
         for row in ins_list:
             self.vcf_tsv[row["ID"]] = row
 
+    def stream_disperced_insertions(self):
+        """
+        Generator that yields all rows of the vcf file and directly after every dispersed duplication the insertion row
+        it causes.
+        :return: Dictionaries representing the rows of the output file.
+        """
+        for row in self.vcf_tsv.iter_records():
+            yield row
+            if row.svtype == "DUP:DISPERSED":
+                yield self.create_insertion_row(row)
+
     def create_insertion_row(self, row):
         """
         Function that creates the row that has to be inserted based on the row it is creating the insertion from.
-        :param row: Dictionary representing a dispersed insertion row that has has to create a new insertion.
+        :param row: Record representing a dispersed insertion row that has has to create a new insertion.
         :return: Dictionary that has all values changed that should be changed for it to represnet the insertion the
         dispersed duplication would have caused.
         """
         # copy the row to prevent manipulating the existing row.
         new_row = row.copy()
-        info_dict = self.get_info_dict(row["INFO"])
-        new_row["CHROM"] = info_dict["INSCHROM"]
+        info_dict = row.info
+        new_row["CHROM"] = row.inschrom
         new_row["POS"] = info_dict["INSPOS"]
         new_row["ID"] = row["ID"] + ".i"
         new_row["ALT"] = "<INS>"
         new_row["INFO"] = self.create_info_value(info_dict)
         return new_row
 
-
-    def get_info_dict(self, info_string):
-        """
-        Fucntion that creates a dictionary out of the value saved under the 'INFO' key. This is done to make extracting
-        the information from this value allot easier and more readable
-        :param info_string: String that is saved under the 'INFO' key in the
-        :return: A dictionary containing the values present in the info_string provided.
-        """
-        info_dict = {}
-        for value in info_string.split(";"):
-            name, val = value.split("=")
-            info_dict[name] = val
-        return info_dict
-
     def create_info_value(self, info_dict):
         """
         Function that creates the new INFO value for the dispersed insertion.
@@ -89,7 +97,12 @@ class AddDispercedDuplications:
         """
         info_list = []
         for key in info_dict:
-            if key not in ["END", "SVTYPE", "INSCHROM", "INSPOS"]:
+            if key in ["END", "SVTYPE", "INSCHROM", "INSPOS"]:
+                continue
+            # flags have no value
+            if info_dict[key] is True:
+                info_list.append(key)
+            else:
                 info_list.append("{}={}".format(key, info_dict[key]))
         info_list.append("SVTYPE=INS:DISPERSED")
         info_str = ";".join(info_list)
@@ -111,4 +124,4 @@ class AddDispercedDuplications:
 
 if __name__ == "__main__":
     args = get_arguments()
-    AddDispercedDuplications(args.vcf, args.output)
+    AddDispercedDuplications(args.vcf, args.output, args.stream, args.memory * 1024 ** 2)
@@ -0,0 +1,131 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import argparse
+import random
+import tempfile
+import time
+from os import path
+
+import correct_vep
+
+
+def get_arguments():
+    """
+    Function using argparse to parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Time the correct_vep.py engines on a synthetic vcf and vep file.')
+    parser.add_argument("--rows", type=int, default=1000000, help="Amount of rows in the synthetic vep file.")
+    parser.add_argument("--engines", nargs="+", default=correct_vep.ENGINES, choices=correct_vep.ENGINES,
+                        help="Engines to time, the first one is the reference for comparing the output.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for generating the synthetic files.")
+    parser.add_argument("--dir", help="Directory to write the files in. A temporary directory if not given.")
+    return parser.parse_args()
+
+
+CONSEQUENCES = ["coding_sequence_variant", "5_prime_UTR_variant", "3_prime_UTR_variant", "intron_variant",
+                "upstream_gene_variant", "downstream_gene_variant", "start_lost", "start_retained_variant",
+                "frameshift_variant", "feature_truncation", "feature_elongation", "intergenic_variant"]
+
+VEP_COLUMNS = ["Uploaded_variation", "Location", "Allele", "Gene", "Feature", "Feature_type", "Consequence",
+               "cDNA_position", "CDS_position", "Protein_position", "Amino_acids", "Codons", "Existing_variation",
+               "Extra"]
+
+
+def write_synthetic_files(directory, rows, seed):
+    """
+    Function that writes a vcf file and a vep file that looks like the vep output for that vcf file. Every variant gets
+    one to four vep rows, like variants overlapping multiple transcripts. About 1 percent of the insertions are not
+    written to the vcf file.
+    :param directory: Directory to write the files in.
+    :param rows: Amount of rows of the vep file.
+    :param seed: Seed for the random generator.
+    :return: The locations of the vcf and the vep file.
+    """
+    rng = random.Random(seed)
+    vcf_file = path.join(directory, "synthetic.vcf")
+    vep_file = path.join(directory, "synthetic_vep.txt")
+    chromosomes = [str(x) for x in range(1, 6)] + ["Mt", "Pt"]
+    alleles = {"DEL": "deletion", "DUP:TANDEM": "duplication", "DUP:DISPERSED": "duplication", "INS": "insertion"}
+    with open(vcf_file, "w") as vcf, open(vep_file, "w") as vep:
+        vcf.write("##fileformat=VCFv4.2\n")
+        vcf.write("##INFO=<ID=END,Number=1,Type=Integer,Description=\"End position of the variant\">\n")
+        vcf.write("##INFO=<ID=SVTYPE,Number=1,Type=String,Description=\"Type of structural variant\">\n")
+        vcf.write("#CHROM\tPOS\tID\tREF\tALT\tQUAL\tFILTER\tINFO\n")
+        vep.write("## ENSEMBL VARIANT EFFECT PREDICTOR v96.0\n## Output produced at 2019-06-13 12:00:00\n")
+        vep.write("#" + "\t".join(VEP_COLUMNS) + "\n")
+        written = 0
+        variant = 0
+        while written < rows:
+            variant += 1
+            chrom = rng.choice(chromosomes)
+            pos = rng.randint(1, 30000000)
+            end = pos + rng.randint(50, 20000)
+            sv_type = rng.choice(list(alleles))
+            if sv_type == "INS":
+                alt = "N" + "".join(rng.choice("ACGT") for _ in range(rng.randint(1, 30)))
+                info = "SVTYPE=INS"
+                location = "{}:{}".format(chrom, pos)
+            else:
+                alt = "<{}>".format(sv_type)
+                info = "END={};SVTYPE={}".format(end, sv_type)
+                location = "{}:{}-{}".format(chrom, pos, end)
+            # some insertions are left out of the vcf file, like IDs vep could not match to the vcf file
+            if sv_type != "INS" or rng.random() >= 0.01:
+                vcf.write("\t".join([chrom, str(pos), str(variant), "N", alt, ".", "PASS", info]) + "\n")
+            for _ in range(min(rng.randint(1, 4), rows - written)):
+                gene = "AT{}G{:05d}".format(chrom, rng.randint(1, 99999))
+                extra = "IMPACT={};STRAND=1".format(rng.choice(["MODIFIER", "LOW", "MODERATE", "HIGH"]))
+                if rng.random() < 0.1:
+                    extra += ";OverlapBP={};OverlapPC=100.00".format(end - pos)
+                consequences = rng.sample(CONSEQUENCES, rng.randint(1, 3))
+                # coding variants get the position in the transcript, the other columns stay empty like vep leaves them
+                positions = ["-", "-", "-"]
+                if "coding_sequence_variant" in consequences:
+                    cds_position = rng.randint(1, 3000)
+                    positions = [str(cds_position + 50), str(cds_position), str((cds_position - 1) // 3 + 1)]
+                vep.write("\t".join([str(variant), location, alleles[sv_type], gene, gene + ".1", "Transcript",
+                                     ",".join(consequences)] + positions + ["-", "-", "-", extra]) + "\n")
+                written += 1
+    return vcf_file, vep_file
+
+
+def run_benchmark(directory, rows, engines, seed):
+    """
+    Function that creates the synthetic files and times every engine on them.
+    :param directory: Directory to write the files in.
+    :param rows: Amount of rows of the vep file.
+    :param engines: List of engine names to time.
+    :param seed: Seed for the random generator.
+    """
+    vcf_file, vep_file = write_synthetic_files(directory, rows, seed)
+    print("Synthetic files with {} vep rows written to {}".format(rows, directory))
+    reference = None
+    for engine in engines:
+        out_file = path.join(directory, "corrected_{}.txt".format(engine))
+        start = time.perf_counter()
+        correct_vep.AddInformationVep(vcf_file, vep_file, out_file, engine=engine).protocol()
+        seconds = time.perf_counter() - start
+        with open(out_file) as f:
+            output = f.read()
+        if reference is None:
+            reference = output
+            comparison = "reference"
+        else:
+            comparison = "identical" if output == reference else "differs from {}".format(engines[0])
+        print("{:<12}{:>10.2f} s   {}".format(engine, seconds, comparison))
+
+
+if __name__ == "__main__":
+    args = get_arguments()
+    if args.dir:
+        run_benchmark(args.dir, args.rows, args.engines, args.seed)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            run_benchmark(temp_dir, args.rows, args.engines, args.seed)
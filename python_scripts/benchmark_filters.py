@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import argparse
+import tempfile
+import time
+from os import path
+
+import numpy as np
+import pandas as pd
+
+import benchmark_correct_vep
+import correct_vep
+import vep_table as vept
+
+
+def get_arguments():
+    """
+    Function using argparse to parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Time the compiled table filters of visualise_vep.py against filtering with regular expressions.')
+    parser.add_argument("--vep", help="Vep file created by correct_vep.py. A synthetic file is made if not given.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Amount of rows in the synthetic vep file.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for generating the synthetic files.")
+    parser.add_argument("--repeat", type=int, default=3, help="Amount of times every query is timed.")
+    return parser.parse_args()
+
+
+# typical queries taken from the examples of the table filter explanation in visualise_vep.py
+QUERIES = [("Consequence", "coding_sequence_variant,frameshift"),
+           ("Consequence", "5_prime_UTR_variant+intron_variant"),
+           ("Consequence", "!downstream_gene_variant,upstream_gene_variant"),
+           ("Consequence", "intron"),
+           ("Allele", "deletion"),
+           ("Gene", "AT1G0"),
+           ("Extra", "IMPACT=HIGH"),
+           ("INFO", "!DUP:TANDEM"),
+           ("ID", ".i")]
+
+
+def regex_filter(values, filter_value):
+    """
+    Function that filters the way the table was filtered before the filters where compiled, by turning the filter into
+    one regular expression that is searched in every value.
+    :param values: pandas Series of the values of a column.
+    :param filter_value: String containing the filter expression without the column name.
+    :return: Boolean array telling for every value if it matches the filter.
+    """
+    if filter_value.startswith("!"):
+        match = False
+        filter_value = filter_value[1:]
+    else:
+        match = True
+    filter_values = "|".join(filter_value.split(","))
+    filter_values = "".join(["(?=.*{})".format(x) for x in filter_values.split("+")])
+    # missing values never matched, with object columns the match is NaN which is neither True nor False
+    return ((values.str.contains(filter_values) == match) & values.notna()).values
+
+
+def read_vep_table(vep_file):
+    """
+    :param vep_file: Vep file created by correct_vep.py.
+    :return: pandas Dataframe of the table read like visualise_vep.py reads it.
+    """
+    with open(vep_file) as f:
+        header_end = sum(1 for line in f if line.startswith("##"))
+    df = pd.read_csv(vep_file, sep="\t", skiprows=range(header_end), header=0, index_col=False)
+    return df.rename(columns={"#Uploaded_variation": "ID"}).reset_index(drop=True)
+
+
+def time_function(function, repeat):
+    """
+    :param function: Function without arguments to time.
+    :param repeat: Amount of times the function is called.
+    :return: The result of the last call and the shortest time in seconds.
+    """
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, min(times)
+
+
+def run_benchmark(vep_file, repeat):
+    """
+    Function that times every query with regular expressions, with a new TextIndex and with a TextIndex that already
+    split the column into its unique values, and checks that the results are the same.
+    :param vep_file: Vep file created by correct_vep.py.
+    :param repeat: Amount of times every query is timed.
+    """
+    df = read_vep_table(vep_file)
+    print("{} rows read from {}".format(len(df), vep_file))
+    text_index = vept.TextIndex(df)
+    print("{:<13}{:<48}{:>9}{:>9}{:>9}{:>9}   {}".format("column", "filter", "matches", "regex", "first", "cached",
+                                                         "comparison"))
+    for col_name, filter_value in QUERIES:
+        values = df[col_name]
+        if pd.api.types.is_numeric_dtype(values):
+            values = values.astype(str)
+        expected, regex_time = time_function(lambda: regex_filter(values, filter_value), repeat)
+        start = time.perf_counter()
+        text_index.select(col_name, filter_value)
+        first_time = time.perf_counter() - start
+        result, cached_time = time_function(lambda: text_index.select(col_name, filter_value), repeat)
+        comparison = "identical" if np.array_equal(expected, result) else "differs"
+        print("{:<13}{:<48}{:>9}{:>9.4f}{:>9.4f}{:>9.4f}   {}".format(col_name, filter_value, int(result.sum()),
+                                                                     regex_time, first_time, cached_time, comparison))
+
+
+if __name__ == "__main__":
+    args = get_arguments()
+    if args.vep:
+        run_benchmark(args.vep, args.repeat)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vcf_file, vep_file = benchmark_correct_vep.write_synthetic_files(temp_dir, args.rows, args.seed)
+            corrected_file = path.join(temp_dir, "added_vep_output.txt")
+            correct_vep.AddInformationVep(vcf_file, vep_file, corrected_file).protocol()
+            run_benchmark(corrected_file, args.repeat)
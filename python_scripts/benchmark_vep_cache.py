@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import argparse
+import tempfile
+import time
+from os import path, remove
+
+import pandas as pd
+
+import benchmark_correct_vep
+import correct_vep
+import vep_table as vept
+
+
+def get_arguments():
+    """
+    Function using argparse to parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Time reading the vep table from the vep file and from the memory mapped cache of vep_table.py and '
+                    'check that both give the same table.')
+    parser.add_argument("--vep", help="Vep file created by correct_vep.py. A synthetic file is made if not given.")
+    parser.add_argument("--rows", type=int, default=1000000, help="Amount of rows in the synthetic vep file.")
+    parser.add_argument("--seed", type=int, default=1, help="Seed for generating the synthetic files.")
+    return parser.parse_args()
+
+
+def compare_tables(expected, result):
+    """
+    :param expected: pandas Dataframe read from the vep file.
+    :param result: pandas Dataframe read from the cache.
+    :return: String telling if the tables are identical or what differs.
+    """
+    dtypes = [col_name for col_name in expected.columns if expected[col_name].dtype != result[col_name].dtype]
+    if dtypes:
+        return "differs in the dtype of {}".format(", ".join(dtypes))
+    try:
+        pd.testing.assert_frame_equal(expected, result)
+    except AssertionError:
+        return "differs in the values"
+    return "identical"
+
+
+def run_benchmark(vep_file):
+    """
+    Function that reads the vep table from the vep file, writes the cache and reads the table from the cache, and
+    checks that the table and the parsed locations are the same every time.
+    :param vep_file: Vep file created by correct_vep.py.
+    """
+    with open(vep_file) as f:
+        header_end = sum(1 for line in f if line.startswith("##"))
+    cache_file = vept.cache_location(vep_file)
+    if path.exists(cache_file):
+        remove(cache_file)
+    start = time.perf_counter()
+    df, locations = vept.read_vep_table(vep_file, header_end)
+    print("{:<24}{:>10.2f} s".format("vep file", time.perf_counter() - start))
+    start = time.perf_counter()
+    vept.load_vep_table(vep_file, header_end)
+    print("{:<24}{:>10.2f} s".format("vep file and cache", time.perf_counter() - start))
+    start = time.perf_counter()
+    cached_df, cached_locations = vept.load_vep_table(vep_file, header_end)
+    print("{:<24}{:>10.2f} s".format("cache", time.perf_counter() - start))
+    print("table       {}".format(compare_tables(df, cached_df)))
+    print("locations   {}".format(compare_tables(locations, cached_locations)))
+
+
+if __name__ == "__main__":
+    args = get_arguments()
+    if args.vep:
+        run_benchmark(args.vep)
+    else:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            vcf_file, vep_file = benchmark_correct_vep.write_synthetic_files(temp_dir, args.rows, args.seed)
+            corrected_file = path.join(temp_dir, "added_vep_output.txt")
+            correct_vep.AddInformationVep(vcf_file, vep_file, corrected_file).protocol()
+            run_benchmark(corrected_file)
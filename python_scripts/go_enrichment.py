@@ -0,0 +1,622 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import argparse
+import csv
+import hashlib
+from os import path, replace
+
+import numpy as np
+import pandas as pd
+
+
+def get_arguments():
+    """
+    Function using argparse to parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Test a study set of genes for enriched GO terms with the Parent-Child-Union method and '
+                    'Benjamini-Hochberg correction, writing a table like the table-* files of Ontologizer.')
+    parser.add_argument("-g", "--obo", help="Obo file with the gene ontology.", required=True)
+    parser.add_argument("-a", "--association", help="Association file in GAF format.", required=True)
+    parser.add_argument("-p", "--population", help="File with all genes of the organism.", required=True)
+    parser.add_argument("-s", "--study", nargs="*", default=[],
+                        help="Files with the genes to test. Without study files only the index is made.")
+    parser.add_argument("-o", "--output_dir", default=".", help="Directory to write the tables into.")
+    parser.add_argument("-i", "--index", help="Compiled index of the obo, association and population file. It is "
+                                              "read when it was made from the same files, otherwise it is (re)made.")
+    return parser.parse_args()
+
+
+# relations next to is_a that make a term the parent of another term, the same relations Ontologizer follows.
+PARENT_RELATIONS = ["part_of"]
+
+# columns of the table-* files Ontologizer writes for the Parent-Child-Union method.
+TABLE_COLUMNS = ["ID", "Pop.total", "Pop.term", "Study.total", "Study.term", "Pop.family", "Study.family",
+                 "nparents", "is.trivial", "p", "p.adjusted", "p.min", "name"]
+
+# amount of genes of which the parent terms are counted at once, this limits the memory used for large populations.
+COUNT_CHUNK_SIZE = 1024
+
+# amount of probabilities summed at once for the hypergeometric tests.
+TAIL_CHUNK_SIZE = 1000000
+
+# file name of the compiled index in the result directory.
+INDEX_NAME = "go_index.npz"
+
+# changing this invalidates all compiled indexes, for when the content of the index changes.
+INDEX_VERSION = 1
+
+# amount of bits that are set in every byte.
+BIT_COUNTS = np.array([bin(byte).count("1") for byte in range(256)], dtype=np.int64)
+
+
+def to_csr(lists):
+    """
+    :param lists: List of lists of integers.
+    :return: The lists as an array of the start of every list and an array of all values after each other.
+    """
+    pointers = np.zeros(len(lists) + 1, dtype=np.int64)
+    pointers[1:] = np.cumsum([len(values) for values in lists])
+    values = np.fromiter((value for values in lists for value in values), dtype=np.int32, count=pointers[-1])
+    return pointers, values
+
+
+def gather_rows(pointers, values, rows):
+    """
+    Function that takes multiple rows out of arrays made by to_csr at once.
+    :param pointers: Array of the start of every row.
+    :param values: Array of the values of all rows after each other.
+    :param rows: Array of the rows to take.
+    :return: The values of the rows after each other and the length of every row.
+    """
+    starts = pointers[rows]
+    lengths = pointers[rows + 1] - starts
+    # every value is at the start of its row plus its place within the row
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(lengths.sum())
+    return values[offsets], lengths
+
+
+def sorted_unique(values):
+    """
+    :param values: Array of integers.
+    :return: Sorted array of the unique values, found by sorting which is faster than hashing for many values.
+    """
+    values = np.sort(values)
+    if not len(values):
+        return values
+    return values[np.concatenate([[True], values[1:] != values[:-1]])]
+
+
+def read_obo(obo_file):
+    """
+    Function that reads the terms of an obo file. Obsolete terms are left out, the alternative ids of a term point to
+    the term itself.
+    :param obo_file: The obo file with the gene ontology.
+    :return: Instance of GeneOntology.
+    """
+    terms = []
+    term = None
+    with open(obo_file) as f:
+        for line in f:
+            line = line.strip()
+            if line.startswith("["):
+                term = {"parents": [], "alt_ids": [], "name": "", "obsolete": False} if line == "[Term]" else None
+                if term is not None:
+                    terms.append(term)
+            elif term is not None and ": " in line:
+                tag, value = line.split(": ", 1)
+                # remove the comment after the value
+                value = value.split(" ! ")[0].strip()
+                if tag == "id":
+                    term["id"] = value
+                elif tag == "name":
+                    term["name"] = value
+                elif tag == "alt_id":
+                    term["alt_ids"].append(value)
+                elif tag == "is_a":
+                    term["parents"].append(value.split()[0])
+                elif tag == "relationship" and value.split()[0] in PARENT_RELATIONS:
+                    term["parents"].append(value.split()[1])
+                elif tag == "is_obsolete":
+                    term["obsolete"] = value == "true"
+    terms = [term for term in terms if "id" in term and not term["obsolete"]]
+    term_index = {term["id"]: i for i, term in enumerate(terms)}
+    parents = [sorted({term_index[parent] for parent in term["parents"] if parent in term_index}) for term in terms]
+    alt_ids = {alt_id: term["id"] for term in terms for alt_id in term["alt_ids"]}
+    parent_pointers, parent_values = to_csr(parents)
+    return GeneOntology([term["id"] for term in terms], [term["name"] for term in terms], parent_pointers,
+                        parent_values, alt_ids)
+
+
+class GeneOntology:
+    def __init__(self, term_ids, names, parent_pointers, parents, alt_ids, ancestor_pointers=None, ancestors=None):
+        """
+        Class that holds the gene ontology as a graph of term numbers. The parents, children and ancestors of the terms
+        are kept as arrays made by to_csr so they can be looked up for many terms at once.
+        :param term_ids: List of the GO ids of the terms, the place of an id is the number of the term.
+        :param names: List of the names of the terms.
+        :param parent_pointers: Array of the start of the parents of every term in parents.
+        :param parents: Array of the numbers of the parents of all terms after each other.
+        :param alt_ids: Dictionary of alternative GO ids to the GO id of their term.
+        :param ancestor_pointers: Array of the start of the ancestors of every term, calculated when not given.
+        :param ancestors: Array of the numbers of the ancestors of all terms, every term is its own ancestor.
+        :param term_index: Dictionary of GO ids, including the alternative ids, to the number of their term.
+        :param child_pointers: Array of the start of the children of every term in children.
+        :param children: Array of the numbers of the children of all terms after each other.
+        """
+        self.term_ids = list(term_ids)
+        self.names = list(names)
+        self.parent_pointers = parent_pointers
+        self.parents = parents
+        self.alt_ids = dict(alt_ids)
+        self.term_index = {term_id: i for i, term_id in enumerate(self.term_ids)}
+        for alt_id, term_id in self.alt_ids.items():
+            self.term_index.setdefault(alt_id, self.term_index[term_id])
+        self.parent_counts = np.diff(parent_pointers)
+        order = np.argsort(parents, kind="mergesort")
+        self.children = np.repeat(np.arange(len(self.term_ids), dtype=np.int32), self.parent_counts)[order]
+        self.child_pointers = np.zeros(len(self.term_ids) + 1, dtype=np.int64)
+        self.child_pointers[1:] = np.cumsum(np.bincount(parents, minlength=len(self.term_ids)))
+        # the parents of every term in a row, rows of terms with less parents are filled up with the number of terms
+        self.parent_table = np.full((len(self.term_ids), max(1, self.parent_counts.max(initial=0))), len(self.term_ids),
+                                    dtype=np.int64)
+        self.parent_table[np.repeat(np.arange(len(self.term_ids)), self.parent_counts),
+                          np.arange(len(parents)) - np.repeat(parent_pointers[:-1], self.parent_counts)] = parents
+        if ancestors is None:
+            ancestor_pointers, ancestors = self.find_ancestors()
+        self.ancestor_pointers = ancestor_pointers
+        self.ancestors = ancestors
+
+    def __len__(self):
+        return len(self.term_ids)
+
+    def find_ancestors(self):
+        """
+        Function that finds the ancestors of every term by walking the graph from the roots down, every term is only
+        visited after all its parents so their ancestors are known.
+        :return: Array of the start of the ancestors of every term and the array of the ancestors of all terms.
+        """
+        ancestors = [None] * len(self)
+        waiting = self.parent_counts.copy()
+        todo = list(np.flatnonzero(waiting == 0))
+        while todo:
+            term = todo.pop()
+            term_parents = self.parents[self.parent_pointers[term]:self.parent_pointers[term + 1]]
+            term_ancestors = {term}
+            for parent in term_parents:
+                term_ancestors.update(ancestors[parent])
+            ancestors[term] = term_ancestors
+            for child in self.children[self.child_pointers[term]:self.child_pointers[term + 1]]:
+                waiting[child] -= 1
+                if waiting[child] == 0:
+                    todo.append(child)
+        if any(term_ancestors is None for term_ancestors in ancestors):
+            raise ValueError("The gene ontology contains a cycle")
+        return to_csr([sorted(term_ancestors) for term_ancestors in ancestors])
+
+
+def read_gaf(gaf_file, ontology):
+    """
+    Function that reads the associations of genes with GO terms from a GAF file. Associations with a NOT qualifier
+    and associations with terms that are not in the ontology are left out. A gene can be named by its id, its symbol
+    and its synonyms.
+    :param gaf_file: The association file in GAF format.
+    :param ontology: Instance of GeneOntology the associations refer to.
+    :return: Instance of Annotations.
+    """
+    gene_index = {}
+    gene_terms = []
+    names = {}
+    with open(gaf_file) as f:
+        for line in f:
+            if line.startswith("!") or not line.strip():
+                continue
+            columns = line.rstrip("\n").split("\t")
+            if len(columns) < 5 or "NOT" in columns[3].split("|") or columns[4] not in ontology.term_index:
+                continue
+            gene_id = columns[1]
+            if gene_id not in gene_index:
+                gene_index[gene_id] = len(gene_terms)
+                gene_terms.append(set())
+            gene = gene_index[gene_id]
+            gene_terms[gene].add(ontology.term_index[columns[4]])
+            synonyms = columns[10].split("|") if len(columns) > 10 else []
+            for name in [gene_id, columns[2]] + synonyms:
+                if name:
+                    names.setdefault(name, gene)
+    # the ids of genes come before symbols and synonyms of other genes with the same name
+    names.update(gene_index)
+    term_pointers, terms = to_csr([sorted(terms) for terms in gene_terms])
+    return Annotations(list(gene_index), term_pointers, terms, names, ontology)
+
+
+class Annotations:
+    def __init__(self, gene_ids, term_pointers, terms, names, ontology, propagated=False):
+        """
+        Class that holds the GO terms of every gene. The terms of a gene include all ancestors of the terms it is
+        associated with, a gene annotated with a term is annotated with its parents as well.
+        :param gene_ids: List of the ids of the genes, the place of an id is the number of the gene.
+        :param term_pointers: Array of the start of the terms of every gene in terms.
+        :param terms: Array of the numbers of the terms of all genes after each other.
+        :param names: Dictionary of the ids, symbols and synonyms of the genes to the number of the gene.
+        :param ontology: Instance of GeneOntology the terms refer to.
+        :param propagated: Boolean telling if the terms already include their ancestors.
+        """
+        self.gene_ids = list(gene_ids)
+        self.names = names
+        self.ontology = ontology
+        if not propagated:
+            term_pointers, terms = self.propagate(term_pointers, terms)
+        self.term_pointers = term_pointers
+        self.terms = terms
+
+    def __len__(self):
+        return len(self.gene_ids)
+
+    def propagate(self, term_pointers, terms):
+        """
+        :param term_pointers: Array of the start of the terms of every gene in terms.
+        :param terms: Array of the numbers of the terms directly associated with the genes.
+        :return: Array of the start of the terms of every gene and the array of the terms of all genes including
+        their ancestors.
+        """
+        genes = np.repeat(np.arange(len(self), dtype=np.int64), np.diff(term_pointers))
+        ancestors, lengths = gather_rows(self.ontology.ancestor_pointers, self.ontology.ancestors, terms)
+        keys = sorted_unique(np.repeat(genes, lengths) * len(self.ontology) + ancestors)
+        propagated_pointers = np.zeros(len(self) + 1, dtype=np.int64)
+        propagated_pointers[1:] = np.cumsum(np.bincount(keys // len(self.ontology), minlength=len(self)))
+        return propagated_pointers, (keys % len(self.ontology)).astype(np.int32)
+
+    def find_genes(self, names):
+        """
+        :param names: Iterable of gene names.
+        :return: Sorted array of the numbers of the genes with these names, names without annotations are left out.
+        """
+        return np.unique(np.array([self.names[name] for name in names if name in self.names], dtype=np.int64))
+
+    def count_terms(self, genes):
+        """
+        Function that counts for every term how many genes are annotated with it and how many genes are annotated with
+        at least one of its parents. The genes of a chunk are kept as a row of bits for every term, the genes of the
+        parents of a term are the bits of the rows of its parents combined with or.
+        :param genes: Array of the numbers of the genes to count.
+        :return: Array with the amount of genes of every term and array with the amount of genes of the parents of
+        every term.
+        """
+        term_count = len(self.ontology)
+        parent_table = self.ontology.parent_table
+        term_counts = np.zeros(term_count, dtype=np.int64)
+        family_counts = np.zeros(term_count, dtype=np.int64)
+        row_bytes = COUNT_CHUNK_SIZE // 8
+        for start in range(0, len(genes), COUNT_CHUNK_SIZE):
+            chunk = genes[start:start + COUNT_CHUNK_SIZE]
+            terms, lengths = gather_rows(self.term_pointers, self.terms, chunk)
+            term_counts += np.bincount(terms, minlength=term_count)
+            gene_numbers = np.repeat(np.arange(len(chunk)), lengths)
+            # every gene has a term once so adding the bits of the genes in the same byte is the same as or
+            bits = np.bincount(terms * row_bytes + gene_numbers // 8, weights=1 << (gene_numbers % 8),
+                               minlength=(term_count + 1) * row_bytes).astype(np.uint8).reshape(-1, row_bytes)
+            family_bits = bits[parent_table[:, 0]]
+            for column in range(1, parent_table.shape[1]):
+                rows = np.flatnonzero(self.ontology.parent_counts > column)
+                family_bits[rows] |= bits[parent_table[rows, column]]
+            family_counts += BIT_COUNTS[family_bits].sum(axis=1)
+        return term_counts, family_counts
+
+
+def read_gene_list(gene_file):
+    """
+    :param gene_file: File with one gene name per line, the name is the first word of the line.
+    :return: List of the gene names.
+    """
+    with open(gene_file) as f:
+        return [line.split()[0] for line in f if line.strip() and not line.startswith("#")]
+
+
+def population_names(names):
+    """
+    Function that turns transcript names into gene names the way the pipeline does, by removing everything after the
+    last dot.
+    :param names: List of gene or transcript names.
+    :return: List of gene names.
+    """
+    return [name.rsplit(".", 1)[0] for name in names]
+
+
+def hypergeometric_tails(population, successes, draws, observed, log_factorials):
+    """
+    Function that calculates the probability to find observed or more annotated genes for many tests at once. The
+    probabilities of all outcomes of the tests are put after each other and summed per test.
+    :param population: Array with the size of the population of every test.
+    :param successes: Array with the amount of the population that is annotated with the term.
+    :param draws: Array with the size of the sample.
+    :param observed: Array with the amount of the sample that is annotated with the term.
+    :param log_factorials: Array of the natural logarithm of the factorial of 0 up to the largest population.
+    :return: Array with the probability of every test.
+    """
+    lows = np.maximum(observed, draws - population + successes)
+    lengths = np.maximum(np.minimum(draws, successes) - lows + 1, 0)
+    ends = np.cumsum(lengths)
+    tails = np.zeros(len(observed))
+    start = 0
+    while start < len(observed):
+        stop = max(start + 1, int(np.searchsorted(ends, ends[start] - lengths[start] + TAIL_CHUNK_SIZE, side="right")))
+        block_lengths = lengths[start:stop]
+        tests = np.repeat(np.arange(start, stop), block_lengths)
+        found = np.repeat(lows[start:stop] - (np.cumsum(block_lengths) - block_lengths), block_lengths) + \
+            np.arange(block_lengths.sum())
+        log_p = (log_choose(successes[tests], found, log_factorials)
+                 + log_choose(population[tests] - successes[tests], draws[tests] - found, log_factorials)
+                 - log_choose(population[tests], draws[tests], log_factorials))
+        tails[start:stop] = np.bincount(tests - start, weights=np.exp(log_p), minlength=stop - start)
+        start = stop
+    return np.minimum(1.0, tails)
+
+
+def log_choose(n, k, log_factorials):
+    """
+    :return: Natural logarithm of n over k.
+    """
+    return log_factorials[n] - log_factorials[k] - log_factorials[n - k]
+
+
+def benjamini_hochberg(p_values):
+    """
+    :param p_values: Array of p-values.
+    :return: Array of the p-values adjusted for the false discovery rate with the Benjamini-Hochberg procedure.
+    """
+    if not len(p_values):
+        return np.array([], dtype=float)
+    order = np.argsort(p_values, kind="mergesort")
+    ranked = p_values[order] * len(p_values) / np.arange(1, len(p_values) + 1)
+    adjusted = np.empty(len(p_values))
+    # the adjusted value of a p-value is never above the adjusted value of a larger p-value
+    adjusted[order] = np.minimum(1.0, np.minimum.accumulate(ranked[::-1])[::-1])
+    return adjusted
+
+
+class GoEnrichment:
+    def __init__(self, annotations, population_genes, population_counts=None):
+        """
+        Class that tests study sets of genes for enriched GO terms with the Parent-Child-Union method of Grossmann et
+        al. (2007). A term is tested against the genes annotated with at least one of its parents instead of the whole
+        population, so terms are not found only because their parents are enriched. The counts of the population are
+        made once, testing a study set only counts the genes of the study set.
+        :param annotations: Instance of Annotations.
+        :param population_genes: Sorted array of the numbers of the annotated genes of the population, made by
+        Annotations.find_genes.
+        :param population_counts: Tuple with the term and parent counts of the population made by count_terms,
+        counted when not given.
+        """
+        self.annotations = annotations
+        self.ontology = annotations.ontology
+        self.population_genes = population_genes
+        if population_counts is None:
+            population_counts = annotations.count_terms(population_genes)
+        self.population_counts = population_counts
+
+    def test(self, study):
+        """
+        Function that tests every term annotated in the population for enrichment in the study set. Like Ontologizer
+        genes of the study set that are not in the population are added to the population and terms without genes in
+        the study set are trivial, they get a p-value of 1 and are not counted in the multiple testing correction.
+        :param study: List of the names of the genes in the study set.
+        :return: pandas Dataframe with the columns of the table-* files of Ontologizer sorted on p-value.
+        """
+        study_genes = self.annotations.find_genes(study)
+        extra_genes = np.setdiff1d(study_genes, self.population_genes)
+        population_terms, population_family = self.population_counts
+        if len(extra_genes):
+            extra_terms, extra_family = self.annotations.count_terms(extra_genes)
+            population_terms = population_terms + extra_terms
+            population_family = population_family + extra_family
+        study_terms, study_family = self.annotations.count_terms(study_genes)
+        population_total = len(self.population_genes) + len(extra_genes)
+        study_total = len(study_genes)
+        # terms without parents are the roots, their family is the whole population
+        roots = self.ontology.parent_counts == 0
+        population_family = np.where(roots, population_total, population_family)
+        study_family = np.where(roots, study_total, study_family)
+
+        terms = np.flatnonzero(population_terms)
+        log_factorials = np.concatenate([[0.0], np.cumsum(np.log(np.arange(1, population_total + 1)))])
+        trivial = study_terms[terms] == 0
+        arguments = (population_family[terms], population_terms[terms], study_family[terms])
+        p_values = np.ones(len(terms))
+        p_values[~trivial] = hypergeometric_tails(*[values[~trivial] for values in arguments],
+                                                  study_terms[terms][~trivial], log_factorials)
+        # the smallest p-value a term can get is when all genes of the family that can have the term have it
+        p_min = hypergeometric_tails(*arguments, np.minimum(study_family[terms], population_terms[terms]),
+                                     log_factorials)
+        p_adjusted = np.ones(len(terms))
+        p_adjusted[~trivial] = benjamini_hochberg(p_values[~trivial])
+        table = pd.DataFrame({"ID": [self.ontology.term_ids[term] for term in terms],
+                              "Pop.total": population_total,
+                              "Pop.term": population_terms[terms],
+                              "Study.total": study_total,
+                              "Study.term": study_terms[terms],
+                              "Pop.family": population_family[terms],
+                              "Study.family": study_family[terms],
+                              "nparents": self.ontology.parent_counts[terms],
+                              "is.trivial": trivial,
+                              "p": p_values,
+                              "p.adjusted": p_adjusted,
+                              "p.min": p_min,
+                              "name": [self.ontology.names[term] for term in terms]},
+                             columns=TABLE_COLUMNS)
+        return table.sort_values(["p", "ID"], kind="mergesort").reset_index(drop=True)
+
+
+def read_enrichment(obo_file, association_file, population_file):
+    """
+    :param obo_file: The obo file with the gene ontology.
+    :param association_file: The association file in GAF format.
+    :param population_file: File with all genes of the organism.
+    :return: Instance of GoEnrichment.
+    """
+    annotations = read_gaf(association_file, read_obo(obo_file))
+    population = population_names(read_gene_list(population_file))
+    return GoEnrichment(annotations, annotations.find_genes(population))
+
+
+def load_enrichment(obo_file, association_file, population_file, index_file=None, key=None):
+    """
+    Function that gives the GoEnrichment of the files. When an index file is given it is read if it was made from the
+    same files, otherwise the files are read and the index is written for the next time.
+    :param obo_file: The obo file with the gene ontology.
+    :param association_file: The association file in GAF format.
+    :param population_file: File with all genes of the organism.
+    :param index_file: Location of the compiled index or None to always read the files.
+    :param key: The inputs_key of the files when it is already known, otherwise the files are hashed.
+    :return: Instance of GoEnrichment.
+    """
+    if index_file is None:
+        return read_enrichment(obo_file, association_file, population_file)
+    if key is None:
+        key = inputs_key(obo_file, association_file, population_file)
+    enrichment = read_index(index_file, key)
+    if enrichment is None:
+        enrichment = read_enrichment(obo_file, association_file, population_file)
+        write_index(index_file, key, enrichment)
+    return enrichment
+
+
+def inputs_key(*input_files):
+    """
+    Function that creates a key from the content of the files, the key changes when one of the files changes. The
+    files are hashed completely because the index has to be remade for any changed association.
+    :param input_files: Locations of the obo, association and population file.
+    :return: String containing the key.
+    """
+    sha = hashlib.sha1(str(INDEX_VERSION).encode())
+    for input_file in input_files:
+        with open(input_file, "rb") as f:
+            for block in iter(lambda: f.read(1024 ** 2), b""):
+                sha.update(block)
+        # separate the files so moving bytes from one file to the next changes the key
+        sha.update(b"\0")
+    return sha.hexdigest()
+
+
+def encode_strings(strings):
+    """
+    :param strings: List of strings without newlines.
+    :return: Array of the bytes of the strings each followed by a newline, smaller than an array of strings.
+    """
+    return np.frombuffer("".join(string + "\n" for string in strings).encode(), dtype=np.uint8)
+
+
+def decode_strings(encoded):
+    """
+    :param encoded: Array made by encode_strings.
+    :return: List of the strings.
+    """
+    return encoded.tobytes().decode().split("\n")[:-1]
+
+
+def read_index(index_file, key):
+    """
+    :param index_file: Location of the compiled index.
+    :param key: The inputs_key of the files.
+    :return: Instance of GoEnrichment, None if there is no index or it was made from different files.
+    """
+    if not path.exists(index_file):
+        return None
+    try:
+        with np.load(index_file) as index:
+            if str(index["key"]) != key:
+                return None
+            arrays = {name: index[name] for name in index.files}
+    except (OSError, ValueError, KeyError):
+        return None
+    term_ids = decode_strings(arrays["term_ids"])
+    alt_ids = dict(zip(decode_strings(arrays["alt_ids"]), [term_ids[term] for term in arrays["alt_terms"]]))
+    ontology = GeneOntology(term_ids, decode_strings(arrays["names"]), arrays["parent_pointers"], arrays["parents"],
+                            alt_ids, arrays["ancestor_pointers"], arrays["ancestors"])
+    names = dict(zip(decode_strings(arrays["gene_names"]), arrays["name_genes"].tolist()))
+    annotations = Annotations(decode_strings(arrays["gene_ids"]), arrays["term_pointers"], arrays["terms"], names,
+                              ontology, propagated=True)
+    return GoEnrichment(annotations, arrays["population_genes"],
+                        (arrays["population_terms"], arrays["population_family"]))
+
+
+def write_index(index_file, key, enrichment):
+    """
+    Function that writes everything GoEnrichment needs as arrays to an uncompressed npz file, reading it back only
+    has to copy the arrays. The file is moved in place when it is complete, so a half written index is never read. If
+    the directory is not writable there simply is no index.
+    :param index_file: Location of the compiled index.
+    :param key: The inputs_key of the files.
+    :param enrichment: Instance of GoEnrichment.
+    """
+    ontology = enrichment.ontology
+    annotations = enrichment.annotations
+    alt_ids = list(ontology.alt_ids)
+    gene_names = list(annotations.names)
+    try:
+        with open(index_file + ".tmp", "wb") as f:
+            np.savez(f, key=np.array(key),
+                     term_ids=encode_strings(ontology.term_ids),
+                     names=encode_strings(ontology.names),
+                     parent_pointers=ontology.parent_pointers,
+                     parents=ontology.parents,
+                     alt_ids=encode_strings(alt_ids),
+                     alt_terms=np.array([ontology.term_index[alt_id] for alt_id in alt_ids], dtype=np.int64),
+                     ancestor_pointers=ontology.ancestor_pointers,
+                     ancestors=ontology.ancestors,
+                     gene_ids=encode_strings(annotations.gene_ids),
+                     term_pointers=annotations.term_pointers,
+                     terms=annotations.terms,
+                     gene_names=encode_strings(gene_names),
+                     name_genes=np.array([annotations.names[name] for name in gene_names], dtype=np.int64),
+                     population_genes=enrichment.population_genes,
+                     population_terms=enrichment.population_counts[0],
+                     population_family=enrichment.population_counts[1])
+        replace(index_file + ".tmp", index_file)
+    except OSError as error:
+        print("WARNING could not write the index {}: {}".format(index_file, error))
+
+
+def study_key(genes, inputs=""):
+    """
+    :param genes: List of gene names of a study set.
+    :param inputs: The inputs_key of the files the study set is tested with.
+    :return: String containing a hash of the inputs and the unique sorted gene names, the same for every study set with
+    the same genes that is tested with the same files.
+    """
+    return hashlib.sha1("\n".join([inputs] + sorted(set(genes))).encode()).hexdigest()
+
+
+def table_name(study_file):
+    """
+    :param study_file: File with the genes of the study set.
+    :return: The file name Ontologizer gives the table of the study set.
+    """
+    return "table-{}-Parent-Child-Union-Benjamini-Hochberg.txt".format(path.splitext(path.basename(study_file))[0])
+
+
+def write_table(table, table_file):
+    """
+    Function that writes a table like Ontologizer does, with true or false for is.trivial and the names in quotes.
+    Reading the file with pandas gives the same table back. The table is moved in place when it is complete, so other
+    processes that wait for the table never read half of it.
+    :param table: pandas Dataframe made by GoEnrichment.test.
+    :param table_file: Location for the table.
+    """
+    table = table.assign(**{"is.trivial": np.where(table["is.trivial"], "true", "false"),
+                            "name": ['"{}"'.format(name) for name in table["name"]]})
+    table.to_csv(table_file + ".tmp", sep="\t", index=False, quoting=csv.QUOTE_NONE)
+    replace(table_file + ".tmp", table_file)
+
+
+if __name__ == "__main__":
+    args = get_arguments()
+    enrichment = load_enrichment(args.obo, args.association, args.population, args.index)
+    for study_file in args.study:
+        write_table(enrichment.test(read_gene_list(study_file)), path.join(args.output_dir, table_name(study_file)))
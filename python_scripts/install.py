@@ -12,7 +12,13 @@ def install():
     program_file_list = ["AnnotatingCNVs/python_scripts/add_dispersed_insertions.py",\
                     "AnnotatingCNVs/python_scripts/correct_vep.py",\
                     "AnnotatingCNVs/python_scripts/vcf_analyser.py",\
+                    "AnnotatingCNVs/python_scripts/split_vcf.py",\
+                    "AnnotatingCNVs/python_scripts/merge_vep.py",\
                     "AnnotatingCNVs/python_scripts/visualise_vep.py",\
+                    "AnnotatingCNVs/python_scripts/vep_table.py",\
+                    "AnnotatingCNVs/python_scripts/ontologizer_jobs.py",\
+                    "AnnotatingCNVs/python_scripts/go_enrichment.py",\
+                    "AnnotatingCNVs/python_scripts/wsgi.py",\
                     "AnnotatingCNVs/nextflow_scripts/annotate_cnvs.nf",\
                     "AnnotatingCNVs/nextflow_scripts/get_go_terms.nf",
                     "Ontologizer.jar",\
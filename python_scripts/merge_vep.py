@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import vcf_analyser as vcfa
+import argparse
+
+# columns of the tab separated output of vep, used for the header when there are no shards
+VEP_COLUMNS = ["Uploaded_variation", "Location", "Allele", "Gene", "Feature", "Feature_type", "Consequence",
+               "cDNA_position", "CDS_position", "Protein_position", "Amino_acids", "Codons", "Existing_variation",
+               "Extra"]
+
+
+def get_arguments():
+    """
+    Function using argparse to parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Merge the vep output of the shards created by split_vcf.py into one sorted vep file.')
+    parser.add_argument("--vep", nargs="*", default=[],
+                        help="Vep output files of the shards. Without files a vep file with only the column header is "
+                             "written, this happens when the vcf file has no rows.")
+    parser.add_argument("-o", "--output", help="Loaction for the output file.", required=True)
+    parser.add_argument("--memory", type=int, default=vcfa.DEFAULT_MEMORY_BUDGET // 1024 ** 2,
+                        help="Megabytes of rows to sort in memory, above this the rows are sorted on disk.")
+    return parser.parse_args()
+
+
+class MergeVep:
+    def __init__(self, vep_files, out_file, memory_budget=vcfa.DEFAULT_MEMORY_BUDGET):
+        """
+        Class that merges the vep output of multiple shards into one file. The rows are sorted like VcfAnalyser sorts
+        vep files, on location and then the Extra column, so the result does not depend on how the vcf was split.
+        The header of the first file is used for the merged file. Without files the output only gets the column header
+        of vep, a vcf file without rows gives no shards.
+        :param vep_files: List of vep output files.
+        :param out_file: The location and name of the output file.
+        :param memory_budget: Amount of bytes of rows that are sorted in memory, above this sorted runs are written to
+        temporary files before they are merged.
+        :param vep_tsvs: instances of VcfAnalyser class in stream mode, one for every file.
+        """
+        self.out_file = out_file
+        self.memory_budget = memory_budget
+        self.vep_tsvs = [vcfa.VcfAnalyser(vep_file, stream=True) for vep_file in vep_files]
+        self.check_column_headers()
+
+    def check_column_headers(self):
+        """
+        Function that makes sure all files have the same columns, rows of files with different columns can not be
+        merged.
+        """
+        if not self.vep_tsvs:
+            return
+        column_header = self.vep_tsvs[0].column_header
+        for vep_tsv in self.vep_tsvs[1:]:
+            if vep_tsv.column_header != column_header:
+                raise ValueError("Columns of {} differ from the columns of {}".format(
+                    vep_tsv.file_loc, self.vep_tsvs[0].file_loc))
+
+    def merge(self):
+        """
+        Function that streams the rows of all files into one sorter and writes the merged file. Every sorted run is
+        read back at the same time in a k-way merge so only the rows that did not go to disk are kept in memory.
+        """
+        if not self.vep_tsvs:
+            with open(self.out_file, "w") as t:
+                t.write("#" + "\t".join(VEP_COLUMNS) + "\n")
+            return
+        vep_tsv = self.vep_tsvs[0]
+        sorter = vcfa.ExternalSorter(vep_tsv.line_sort_key("Extra"), self.memory_budget)
+        try:
+            for shard_tsv in self.vep_tsvs:
+                with open(shard_tsv.file_loc) as f:
+                    for line in f:
+                        if line.strip() and not line.startswith("#"):
+                            sorter.add(line.rstrip("\n") + "\n")
+            with open(self.out_file, "w") as t:
+                t.write(vep_tsv.header_text())
+                t.writelines(sorter.sorted_lines())
+        finally:
+            sorter.close()
+
+
+if __name__ == "__main__":
+    args = get_arguments()
+    MergeVep(args.vep, args.output, args.memory * 1024 ** 2).merge()
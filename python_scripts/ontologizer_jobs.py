@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from os import path, remove, listdir
+
+import pandas as pd
+
+import go_enrichment as goe
+import vep_table as vept
+
+# amount of ontologizer runs that run at the same time, other runs wait in the queue until one is done.
+DEFAULT_MAX_JOBS = 2
+
+# amount of parsed result tables kept in memory.
+DEFAULT_MAX_TABLES = 16
+
+# amount of finished jobs kept for pages that did not poll them yet, the oldest finished jobs are removed first.
+DEFAULT_MAX_FINISHED_JOBS = 64
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+
+class ResultStore:
+    def __init__(self, max_tables=DEFAULT_MAX_TABLES):
+        """
+        Class that keeps the result tables of the study sets that were tested. The tables are found by the study_key
+        of their genes and the files they were tested with, so testing the same genes under another name gives the
+        table of the first test, but not after the obo, association or population file changed. The last used tables are
+        kept parsed in memory so paging and changing the p-value do not read the file again.
+        :param max_tables: Amount of parsed tables kept in memory.
+        :param files: Dictionary of study keys to the location of their result table.
+        :param tables: LruCache of result table locations to the parsed table.
+        :param inputs_key: The inputs_key of the files the results are tested with, None before set_inputs is called.
+        """
+        self.files = {}
+        self.tables = vept.LruCache(max_tables)
+        self.lock = threading.Lock()
+        self.inputs_key = None
+
+    def set_inputs(self, result_dir, inputs_key, input_files):
+        """
+        Function that sets the files the study sets are tested with. The first time and when the files changed the
+        results of other files are forgotten and the result tables in the directory are scanned again.
+        :param result_dir: Directory with the study sets and result tables.
+        :param inputs_key: The inputs_key of the obo, association and population file.
+        :param input_files: Locations of the obo, association and population file.
+        """
+        with self.lock:
+            if inputs_key == self.inputs_key:
+                return
+            self.inputs_key = inputs_key
+            self.files.clear()
+        self.tables.clear()
+        self.scan(result_dir, input_files)
+
+    def scan(self, result_dir, input_files):
+        """
+        Function that adds the results of study sets tested before, every study set is a file next to a result table
+        named after it, like the ident_ files of the dash app and the study set of annotate_cnvs.nf. Only tables that
+        are newer than the input files are added, older tables can be made with other versions of the files.
+        :param result_dir: Directory with the study sets and result tables.
+        :param input_files: Locations of the obo, association and population file.
+        """
+        newest_input = max(path.getmtime(input_file) for input_file in input_files)
+        dir_list = listdir(result_dir)
+        for study_file in dir_list:
+            if study_file.endswith(".txt") and goe.table_name(study_file) in dir_list:
+                GO_file = path.join(result_dir, goe.table_name(study_file))
+                if path.getmtime(GO_file) >= newest_input:
+                    genes = goe.read_gene_list(path.join(result_dir, study_file))
+                    self.add(self.study_key(genes), GO_file)
+
+    def study_key(self, genes):
+        """
+        :param genes: List of gene names of a study set.
+        :return: The study_key of the genes tested with the current input files.
+        """
+        return goe.study_key(genes, self.inputs_key or "")
+
+    def find(self, key):
+        """
+        :param key: The study_key of a study set.
+        :return: Location of the result table of the study set, None if it was not tested or the table was removed.
+        """
+        with self.lock:
+            GO_file = self.files.get(key)
+        if GO_file is not None and path.exists(GO_file):
+            return GO_file
+        return None
+
+    def add(self, key, GO_file, table=None):
+        """
+        :param key: The study_key of a study set.
+        :param GO_file: Location of the result table of the study set.
+        :param table: pandas Dataframe of the result table, so showing it does not have to read the file.
+        """
+        with self.lock:
+            self.files[key] = GO_file
+        if table is not None:
+            self.tables.put(GO_file, table)
+
+    def read_table(self, GO_file):
+        """
+        :param GO_file: Location of a result table.
+        :return: pandas Dataframe of the table, from memory when it was used recently.
+        """
+        table = self.tables.get(GO_file)
+        if table is None:
+            table = pd.read_csv(GO_file, sep="\t", header=0, float_precision="round_trip")
+            self.tables.put(GO_file, table)
+        return table
+
+    def clear(self):
+        with self.lock:
+            self.files.clear()
+        self.tables.clear()
+
+
+class OntologizerJob:
+    def __init__(self, job_id, study_set, output_dir, load_enrichment):
+        """
+        Class that holds one GO enrichment test of a study set and its state. The state is changed by the thread that
+        runs the job and read by the dash callbacks that poll it.
+        :param job_id: String identifying the job.
+        :param study_set: Location of the file with the gene identifiers to test, the result table is named after it.
+        :param output_dir: Directory the result table is written into.
+        :param load_enrichment: Function without arguments that gives the GoEnrichment to test with. The first job
+        that calls it reads the ontology and associations, the other jobs get the same instance.
+        :param status: One of queued, running, done or failed.
+        :param GO_file: Location of the result table once the job is done.
+        :param message: String telling the user what happened when the job failed or found an earlier result.
+        :param key: The study_key of the study set, set when the job is submitted.
+        :param results: ResultStore the result is added to, set when the job is submitted.
+        """
+        self.job_id = job_id
+        self.study_set = study_set
+        self.output_dir = output_dir
+        self.load_enrichment = load_enrichment
+        self.status = QUEUED
+        self.GO_file = None
+        self.message = ""
+        self.key = None
+        self.results = None
+
+    def run(self):
+        """
+        Function that tests the study set and writes the result table like the table-* files of Ontologizer. When no
+        result table is created the study set is removed so the user can use the same name again.
+        """
+        self.status = RUNNING
+        try:
+            # an identical study set submitted at the same time may have finished while this one was queued
+            if self.results is not None and self.results.find(self.key) is not None:
+                self.reuse(self.results.find(self.key))
+                return
+            table = self.load_enrichment().test(goe.read_gene_list(self.study_set))
+            GO_file = path.join(self.output_dir, goe.table_name(self.study_set))
+            goe.write_table(table, GO_file)
+            if self.results is not None:
+                self.results.add(self.key, GO_file, table)
+            self.GO_file = GO_file
+            self.status = DONE
+        except Exception as error:
+            # any error has to end the job, otherwise the page keeps polling a job that never finishes
+            self.fail("Something went wrong while running ontologizer: {}".format(error))
+        finally:
+            # the finished job does not keep the dataset of the enrichment in memory
+            self.load_enrichment = None
+
+    def reuse(self, GO_file):
+        """
+        :param GO_file: Location of the result table of an earlier test of the same genes.
+        """
+        self.GO_file = GO_file
+        self.message = "The same genes were tested before, showing the results of {}".format(GO_file)
+        self.status = DONE
+
+    def fail(self, message):
+        """
+        :param message: String telling the user what went wrong.
+        """
+        self.message = message
+        self.status = FAILED
+        if path.exists(self.study_set):
+            remove(self.study_set)
+
+
+class OntologizerJobs:
+    def __init__(self, max_jobs=DEFAULT_MAX_JOBS, max_finished=DEFAULT_MAX_FINISHED_JOBS):
+        """
+        Class that runs ontologizer jobs in the background so the dash server does not wait for them. Every job runs
+        in a thread of the pool, the size of the pool limits how many jobs run at the same time. A job is removed when
+        the page that started it saw it finish, finished jobs that are not polled, because the page was closed or the
+        poll went to another worker, are removed when there are more than max_finished of them.
+        :param max_jobs: Amount of jobs that run at the same time.
+        :param max_finished: Amount of finished jobs that are kept.
+        :param jobs: OrderedDict of job ids to their OntologizerJob, the oldest job first.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_jobs)
+        self.max_finished = max_finished
+        self.jobs = OrderedDict()
+        self.lock = threading.Lock()
+
+    def submit(self, study_set, output_dir, load_enrichment, results=None):
+        """
+        Function that queues a new GO enrichment test. When the genes of the study set were tested before the job is
+        done at once with the earlier result table.
+        :param study_set: Location of the file with the gene identifiers to test.
+        :param output_dir: Directory the result table is written into.
+        :param load_enrichment: Function without arguments that gives the GoEnrichment to test with.
+        :param results: ResultStore with the earlier results and the current input files, or None to always test.
+        :return: The OntologizerJob, its job_id identifies it for get.
+        """
+        job = OntologizerJob(uuid.uuid4().hex, study_set, output_dir, load_enrichment)
+        with self.lock:
+            self.jobs[job.job_id] = job
+            self.remove_finished()
+        if results is not None:
+            job.key = results.study_key(goe.read_gene_list(study_set))
+            job.results = results
+            GO_file = results.find(job.key)
+            if GO_file is not None:
+                job.reuse(GO_file)
+                return job
+        self.executor.submit(job.run)
+        return job
+
+    def get(self, job_id):
+        """
+        :param job_id: String containing the id of a job.
+        :return: The OntologizerJob with this id or None if there is no such job.
+        """
+        with self.lock:
+            return self.jobs.get(job_id)
+
+    def remove(self, job_id):
+        """
+        :param job_id: String containing the id of a finished job.
+        """
+        with self.lock:
+            self.jobs.pop(job_id, None)
+
+    def remove_finished(self):
+        """
+        Function that removes the oldest finished jobs until at most max_finished are left. Needs to be called with
+        the lock.
+        """
+        finished = [job_id for job_id, job in self.jobs.items() if job.status in (DONE, FAILED)]
+        for job_id in finished[:max(len(finished) - self.max_finished, 0)]:
+            del self.jobs[job_id]
+
+    def shutdown(self):
+        """
+        Function that waits for the running jobs and stops the threads.
+        """
+        self.executor.shutdown(wait=True)
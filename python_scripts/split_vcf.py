@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import re
+import vcf_analyser as vcfa
+import argparse
+from os import path
+
+
+def get_arguments():
+    """
+    Function using argparse to parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(
+        description='Split a vcf file into shards that can be annotated by vep in parallel.')
+    parser.add_argument("-vcf", "--vcf", help="Input file in VCF format.", required=True)
+    parser.add_argument("-o", "--output_dir", default=".", help="Directory to write the shards into.")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument("--by_chrom", action="store_true", help="Write one shard per chromosome.")
+    group.add_argument("--shards", type=int,
+                       help="Amount of shards with about the same amount of rows, consecutive rows stay together.")
+    return parser.parse_args()
+
+
+class SplitVcf:
+    def __init__(self, vcf_file, output_dir):
+        """
+        Class that splits a vcf file into multiple vcf files. Every shard gets the complete header so it is a valid vcf
+        file on its own. The rows are written as they are, so merging the vep output of the shards gives the same
+        rows as running vep on the whole file.
+        :param vcf_file: The input file in vcf format.
+        :param output_dir: The directory the shards are written to.
+        :param vcf_tsv: instance of VcfAnalyser class in stream mode, only the header is kept in memory.
+        """
+        self.output_dir = output_dir
+        self.vcf_tsv = vcfa.VcfAnalyser(vcf_file, stream=True)
+
+    def split_by_chromosome(self):
+        """
+        Function that writes every chromosome into its own shard. The shards are named after the chromosome with
+        characters that are not allowed in file names replaced by an underscore. A vcf file without rows gives no
+        shards, so vep is not run on a file with only a header.
+        :return: List of the locations of the written shards.
+        """
+        shards = {}
+        shard_names = set()
+        try:
+            for line in self.iter_lines():
+                chrom = line.split("\t", 1)[0]
+                if chrom not in shards:
+                    shard_name = "shard_{}.vcf".format(re.sub(r"[^\w.-]", "_", chrom))
+                    if shard_name in shard_names:
+                        # two chromosomes only differing in replaced characters
+                        shard_name = "shard_{}_{}.vcf".format(re.sub(r"[^\w.-]", "_", chrom), len(shards))
+                    shard_names.add(shard_name)
+                    shards[chrom] = self.open_shard(shard_name)
+                shards[chrom].write(line)
+        finally:
+            for shard in shards.values():
+                shard.close()
+        return [shard.name for shard in shards.values()]
+
+    def split_into_shards(self, shard_count):
+        """
+        Function that writes the rows into shard_count shards that differ at most one row in size. Rows that follow
+        each other in the input stay together, for a sorted input every shard covers one region of the genome. Files
+        with less rows than shard_count give one shard per row and files without rows give no shards.
+        :param shard_count: The amount of shards to create.
+        :return: List of the locations of the written shards.
+        """
+        if shard_count < 1:
+            raise ValueError("The amount of shards has to be at least 1, not {}".format(shard_count))
+        row_count = sum(1 for _ in self.iter_lines())
+        shard_count = min(shard_count, row_count)
+        if shard_count == 0:
+            return []
+        base_size, larger_shards = divmod(row_count, shard_count)
+        shard_names = []
+        lines = self.iter_lines()
+        for shard_number in range(shard_count):
+            shard_size = base_size + (1 if shard_number < larger_shards else 0)
+            with self.open_shard("shard_{:04d}.vcf".format(shard_number)) as shard:
+                for _ in range(shard_size):
+                    shard.write(next(lines))
+                shard_names.append(shard.name)
+        return shard_names
+
+    def iter_lines(self):
+        """
+        Generator that yields the rows of the vcf file as they are in the file.
+        :return: Strings containing a row including the newline.
+        """
+        with open(self.vcf_tsv.file_loc) as f:
+            for line in f:
+                if line.strip() and not line.startswith("#"):
+                    yield line if line.endswith("\n") else line + "\n"
+
+    def open_shard(self, shard_name):
+        """
+        Function that opens a new shard and writes the header of the input file into it.
+        :param shard_name: File name of the shard.
+        :return: The opened file.
+        """
+        shard = open(path.join(self.output_dir, shard_name), "w")
+        shard.write(self.vcf_tsv.header_text())
+        return shard
+
+
+if __name__ == "__main__":
+    args = get_arguments()
+    splitter = SplitVcf(args.vcf, args.output_dir)
+    if args.by_chrom:
+        splitter.split_by_chromosome()
+    else:
+        splitter.split_into_shards(args.shards)
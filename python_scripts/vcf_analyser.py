@@ -7,80 +7,167 @@ Date: 13/06/2019
 """
 
 import sys
+import heapq
+import tempfile
+from array import array
+from functools import lru_cache
+from types import MappingProxyType
+
+# amount of bytes of lines that are sorted in memory before falling back to sorting on disk
+DEFAULT_MEMORY_BUDGET = 512 * 1024 ** 2
+
+# amount of rows of which the values are taken from the columns at once when writing lines
+LINE_CHUNK_SIZE = 10000
 
 
 class VcfAnalyser:
 
-    def __init__(self, file_loc, key_name=None):
+    def __init__(self, file_loc, key_name=None, stream=False):
         """
-        Class that takes a vcf or vep file and stores it as dictionary of dictionaries for manipulation purposes.
+        Class that takes a vcf or vep file and stores it as dictionary of dictionaries for manipulation purposes. The
+        data itself is saved column wise in a ColumnStore that behaves like a dictionary of dictionaries.
         :param file_loc: The location of the vcf or vep file.
         :param key_name: Potential name of a column in the vcf or vep file to function as key for the saving of
         the inner dictionaries
-        :param tsv_string: string containing the whole file.
-        :param tsv_dict: the dictionary of dictionaries that holds all the data neccesairy.
+        :param stream: Boolean telling if the file should be streamed. In that case only the header is read and the
+        rows can be retrieved one at a time with iter_records, nothing of the body is kept in memory.
+        :param tsv_dict: ColumnStore that holds all the data neccesairy and can be used as dictionary of dictionaries.
         :param header: list that holds the header of the repsective file
         :param column_header: list that holds the column header of the repsective file.
         """
         self.file_loc = file_loc
         self.key_name = key_name
-        self.tsv_string = self.get_tsv_text(file_loc)
-        self.tsv_dict = {}
+        self.stream = stream
+        self.tsv_dict = ColumnStore(keyed=key_name is not None)
         self.header = []
         self.column_header = []
-        #create the dictionary of dictionaries while innialising the class
-        self.tsv_to_dict()
-        
-    def get_tsv_text(self, file_loc):
-        """
-        Function that opens a file and returns its contents
-        :return: String that contains the whole file
-        """
-        t = open(file_loc)
-        tsv_text = t.read()
-        t.close()
-        return tsv_text
+        if stream:
+            self.read_header()
+        else:
+            #create the dictionary of dictionaries while innialising the class
+            self.tsv_to_dict()
 
     def tsv_to_dict(self):
         """
         Function that loops trough all lines in a vcf or vep file and seperates header, column header and the tab
-        seperated rows. The rows get put into a dictionary of dictionaries with the outer dictionary containing key names
-        as provided by self.key_name and the inner dictionary containing column names and their respective values.
-        """
-        tsv_rows = []
-        for line in self.tsv_string.split("\n"):
-            #header lines
-            if line.startswith("##"):
-                self.header.append(line)
-            #column header line.
-            elif line.startswith("#"):
-                self.column_header = line[1:].split("\t")
-            elif line:
-                tsv_rows.append(line)
-        for x in range(len(tsv_rows)):
-            #seperates each row element seperated by tabs into a dictionary
-            inner_dict = dict(zip(self.column_header, tsv_rows[x].split("\t")))
-            #if not unique key is provided the outer dictionary is simply saved by a number.
-            if self.key_name:
-                self.tsv_dict[inner_dict[self.key_name]] = inner_dict
-            else:
-                self.tsv_dict[str(x)] = inner_dict
+        seperated rows. The rows get put into the column store with keys as provided by self.key_name, the rows can then
+        be retrieved as records containing column names and their respective values. The file is read line by line, when
+        all rows are read the columns with few different values are turned into codes.
+        """
+        key_index = None
+        with open(self.file_loc) as f:
+            for line in f:
+                line = line.rstrip("\n")
+                #header lines
+                if line.startswith("##"):
+                    self.header.append(line)
+                #column header line.
+                elif line.startswith("#"):
+                    self.column_header = line[1:].split("\t")
+                    self.tsv_dict.add_columns(self.column_header)
+                    if self.key_name:
+                        key_index = self.column_header.index(self.key_name)
+                elif line:
+                    values = line.split("\t")
+                    #if not unique key is provided the row is simply saved by its number.
+                    if key_index is not None:
+                        self.tsv_dict.set_row(values[key_index], values)
+                    else:
+                        self.tsv_dict.append_row(values)
+        self.tsv_dict.compact()
+
+    def read_header(self):
+        """
+        Function that only reads the header and column header of the file. The file is closed as soon as the first row
+        is encountered.
+        """
+        with open(self.file_loc) as f:
+            for line in f:
+                if line.startswith("##"):
+                    self.header.append(line.rstrip("\n"))
+                elif line.startswith("#"):
+                    self.column_header = line.rstrip("\n")[1:].split("\t")
+                else:
+                    break
+
+    def iter_records(self):
+        """
+        Generator that reads the file line by line and yields the rows one at a time. Only one row is in memory at any
+        moment so this works for files of any size.
+        :return: StreamRecords containing column names and their respective values, like the records of self.tsv_dict.
+        """
+        with open(self.file_loc) as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line and not line.startswith("#"):
+                    yield self.record_from_line(line)
+
+    def iter_chunks(self, chunk_size):
+        """
+        Generator that reads the file line by line and yields the rows in chunks of raw lines, for handing rows to other
+        processes without turning them into records first.
+        :param chunk_size: Maximum amount of lines in a chunk.
+        :return: Lists of lines without the newline.
+        """
+        chunk = []
+        with open(self.file_loc) as f:
+            for line in f:
+                line = line.rstrip("\n")
+                if line and not line.startswith("#"):
+                    chunk.append(line)
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+        if chunk:
+            yield chunk
+
+    def record_from_line(self, line):
+        """
+        :param line: A row of the file without the newline.
+        :return: StreamRecord containing column names and their respective values.
+        """
+        return StreamRecord(zip(self.column_header, line.split("\t")))
+
+    def records_to_file(self, out_file, records):
+        """
+        Function that writes the header, the column header and a stream of rows to a file. The rows are written in the
+        order they are given, so no sorting happens.
+        :param out_file: Location and name of the file to write the output into
+        :param records: Iterable of dictionaries representing the rows, for instance from iter_records.
+        """
+        with open(out_file, "w") as t:
+            t.write(self.header_text())
+            for row in records:
+                t.write(self.row_to_line(row))
+
+    def header_text(self):
+        """
+        Function that creates the header and column header part of the file.
+        :return: String containing the header lines and the column header line.
+        """
+        return "\n".join(self.header) + "\n" + "#" + "\t".join(self.column_header) + "\n"
+
+    def row_to_line(self, row):
+        """
+        Function that turns a row back into a line of the file. Every value is followed by a tab, this is how the files
+        have always been written.
+        :param row: Dictionary representing a row of the file.
+        :return: String containing the line including the newline.
+        """
+        return "\t".join([row[name] for name in self.column_header]) + "\t\n"
 
     def vep_to_file(self, out_file, info_key):
         """
-        Function that takes a vep dictiory fo dictionaries and writes a sorted string to a file.
+        Function that takes a vep dictiory fo dictionaries and writes the sorted rows to a file.
         :param out_file: Location and name of the file to write the output into
         :param info_key: key that contains the info column for furter sorting after location. This is relevant for
         dispersed duplications that can have the same location but are inserted in different locations.
         """
-        tsv_text = self.to_string(info_key)
-        t = open(out_file, "w")
-        t.write(tsv_text)
-        t.close()
+        self.write_sorted(out_file, info_key)
 
     def vcf_to_file(self, out_file, info_key):
         """
-        Function that takes a vcf dictiory fo dictionaries and writes a sorted string to a file. An extra step of
+        Function that takes a vcf dictiory fo dictionaries and writes the sorted rows to a file. An extra step of
         creating a location value is needed for proper sorting of the values.
         :param out_file: Location and name of the file to write the output into
         :param info_key: key that contains the info column for furter sorting after location. This is relevant for
@@ -90,10 +177,18 @@ class VcfAnalyser:
         for key, row in self.tsv_dict.items():
             loc_value = self.create_loc_value(row)
             self.tsv_dict[key]["Location"] = loc_value
-        tsv_text = self.to_string(info_key)
-        t = open(out_file, "w")
-        t.write(tsv_text)
-        t.close()
+        self.write_sorted(out_file, info_key)
+
+    def write_sorted(self, out_file, info_key):
+        """
+        Function that writes the header and the rows sorted on location to a file. The lines are handed to the buffered
+        file object one by one so the file is never build as one string in memory.
+        :param out_file: Location and name of the file to write the output into
+        :param info_key: key that contains the info column for furter sorting after location.
+        """
+        with open(out_file, "w") as t:
+            t.write(self.header_text())
+            t.writelines(self.iter_lines(self.sorted_row_ids(info_key)))
 
     def create_loc_value(self, row):
         """
@@ -102,13 +197,9 @@ class VcfAnalyser:
         :param row: Dicitonary representing a row of the vcf file.
         :return: String containing a location value in the genome browser syntax.
         """
-        end_val = [x for x in row["INFO"].split(";") if "END=" in x]
-        try:
-            end_loc = end_val[1]
-        except IndexError:
-            # in case of an insertion there is no end pos so just take the start
-            end_loc = row["POS"]
-        loc_value = "{}:{}-{}".format(row["CHROM"], row["POS"], *end_loc)
+        # in case of an insertion there is no end pos so just take the start
+        end_loc = parse_info(row["INFO"]).get("END", row["POS"])
+        loc_value = "{}:{}-{}".format(row["CHROM"], row["POS"], end_loc)
         return loc_value
 
     def to_string(self, info_key):
@@ -119,16 +210,35 @@ class VcfAnalyser:
         :return: A string containing the whole self.tsv_dict value together with the header and column header back into
         the csv or vep file it originally was. Sorted on location.
         """
-        dict_list = [value for key, value in self.tsv_dict.items()]
-        dict_list.sort(key=lambda x: self.sort_by(x["Location"], x[info_key]))
-        dict_str = ""
-        for dictionary in dict_list:
-            for name in self.column_header:
-                dict_str += dictionary[name] + "\t"
-            dict_str += "\n"
-        self.header = "\n".join(self.header) + "\n"
-        self.column_header = "#" + "\t".join(self.column_header) + "\n"
-        return self.header + self.column_header + dict_str
+        return self.header_text() + "".join(self.iter_lines(self.sorted_row_ids(info_key)))
+
+    def sorted_row_ids(self, info_key):
+        """
+        Function that sorts the row ids of self.tsv_dict on location and then on the info_key column. The locations are
+        parsed once into compact integer arrays after which the rows are sorted with a couple of stable sorts, from the
+        least to the most important value. This gives the same order as sorting on the tuples of sort_by.
+        :param info_key: key that contains the info column for furter sorting after location.
+        :return: List of row ids in sorted order.
+        """
+        row_ids = self.tsv_dict.row_ids()
+        chrom_ranks, starts, ends = location_arrays(self.tsv_dict.columns["Location"], row_ids)
+        infos = self.tsv_dict.columns[info_key]
+        for values in (infos, ends, starts, chrom_ranks):
+            row_ids.sort(key=values.__getitem__)
+        return row_ids
+
+    def iter_lines(self, row_ids):
+        """
+        Generator that creates the lines of the file for the given rows straight from the columns of self.tsv_dict. The
+        values are taken from the columns a chunk of rows at a time.
+        :param row_ids: List of row ids in the order they should be written.
+        :return: Strings containing a line of the file including the trailing tab and the newline.
+        """
+        columns = [self.tsv_dict.columns[name] for name in self.column_header]
+        for start in range(0, len(row_ids), LINE_CHUNK_SIZE):
+            chunk = row_ids[start:start + LINE_CHUNK_SIZE]
+            for values in zip(*[take(column, chunk) for column in columns]):
+                yield "\t".join(values) + "\t\n"
 
     def sort_by(self, loc, info):
         """
@@ -138,19 +248,46 @@ class VcfAnalyser:
         :return: A tuple containing True or false depending on if the chromosome was an integer or not. The chromonsome
         value, the start of the variant, the end of the variant, the info value associated with the variant.
         """
-        chrom = loc.split(":")[0]
-        if "-" in loc:
-            start, end = loc.split(":")[1].split("-")
-        # in case of insertions
-        else:
-            start = loc.split(":")[1]
-            end = start
-        # see if the chromosome can be made into an integer If this is the
-        # case False is put at the start to make the numbered chromosomes come first
-        try:
-            return (False, int(chrom), int(start), int(end), info)
-        except ValueError:
-            return (True, chrom, int(start), int(end), info)
+        chrom, start, end = split_location(loc)
+        return chromosome_key(chrom) + (int(start), int(end), info)
+
+    def line_sort_key(self, info_key):
+        """
+        Function that creates a function that gives the sort_by tuple for a line of the file. Vcf files do not have a
+        location column so for those the location is created from the row like vcf_to_file does.
+        :param info_key: key that contains the info column for furter sorting after location.
+        :return: Function that takes a line and returns a tuple to sort on.
+        """
+        info_index = self.column_header.index(info_key)
+        if "Location" in self.column_header:
+            loc_index = self.column_header.index("Location")
+
+            def vep_key(line):
+                values = line.split("\t")
+                return self.sort_by(values[loc_index], values[info_index])
+            return vep_key
+
+        def vcf_key(line):
+            values = line.split("\t")
+            return self.sort_by(self.create_loc_value(dict(zip(self.column_header, values))), values[info_index])
+        return vcf_key
+
+    def sorted_records_to_file(self, out_file, records, info_key, memory_budget=DEFAULT_MEMORY_BUDGET):
+        """
+        Function that writes a stream of rows sorted on location and the info_key column to a file. Rows are sorted in
+        memory until the memory budget is reached, after that sorted runs are written to temporary files and merged.
+        :param out_file: Location and name of the file to write the output into
+        :param records: Iterable of dictionaries representing the rows, for instance from iter_records.
+        :param info_key: key that contains the info column for furter sorting after location.
+        :param memory_budget: Approximate amount of bytes of lines to keep in memory before writing a sorted run.
+        """
+        sorter = ExternalSorter(self.line_sort_key(info_key), memory_budget)
+        for row in records:
+            sorter.add(self.row_to_line(row))
+        with open(out_file, "w") as t:
+            t.write(self.header_text())
+            t.writelines(sorter.sorted_lines())
+        sorter.close()
 
 ######## MAGIC METHODS #############
 # these methods are here to make the class instance behave as a dictionary.
@@ -166,3 +303,530 @@ class VcfAnalyser:
 
     def __delitem__(self, key):
         del self.tsv_dict[key]
+
+
+def split_location(loc):
+    """
+    Function that splits a location in genome browser syntax (1:5-10 or 1:5 for insertions).
+    :param loc: String containing the location.
+    :return: Tuple of strings containing the chromosome, start and end. For insertions the end is the start.
+    """
+    chrom, _, positions = loc.partition(":")
+    start, _, end = positions.partition("-")
+    return chrom, start, end or start
+
+
+def chromosome_key(chrom):
+    """
+    Function that creates the part of the sort tuple for a chromosome. Numbered chromosomes come first and are sorted as
+    numbers, the other chromosomes are sorted as strings after them.
+    :param chrom: String containing the chromosome name.
+    :return: Tuple containing a boolean telling if the chromosome is not a number and the chromosome value.
+    """
+    try:
+        return (False, int(chrom))
+    except ValueError:
+        return (True, chrom)
+
+
+def location_arrays(locations, row_ids):
+    """
+    Function that parses locations once into compact integer arrays that can be used to sort on.
+    :param locations: List of location strings indexed by row id.
+    :param row_ids: Row ids that have to be parsed, all other positions are left at 0.
+    :return: Three arrays indexed by row id holding the rank of the chromosome following the sort_by order, the start
+    and the end of the location.
+    """
+    chrom_ranks = array("l", bytes(array("l").itemsize * len(locations)))
+    starts = array("q", bytes(8 * len(locations)))
+    ends = array("q", bytes(8 * len(locations)))
+    chroms = {}
+    for row in row_ids:
+        chrom, start, end = split_location(locations[row])
+        starts[row] = int(start)
+        ends[row] = int(end)
+        chroms.setdefault(chrom, []).append(row)
+    for rank, chrom in enumerate(sorted(chroms, key=chromosome_key)):
+        for row in chroms[chrom]:
+            chrom_ranks[row] = rank
+    return chrom_ranks, starts, ends
+
+
+@lru_cache(maxsize=4096)
+def parse_info(info_string):
+    """
+    Function that parses the value of an INFO column into a dictionary. Results are cached on the string, rows of a
+    vep file that come from the same variant share the same INFO value so these are only parsed once.
+    :param info_string: String in the form of KEY=value;FLAG;KEY=value.
+    :return: Read only dictionary with the INFO keys and their values. Flags without a value get True as value.
+    """
+    info_dict = {}
+    for value in info_string.split(";"):
+        if not value or value == ".":
+            continue
+        name, has_value, val = value.partition("=")
+        info_dict[name] = val if has_value else True
+    return MappingProxyType(info_dict)
+
+
+class InfoAccessors:
+    """
+    Class that gives a record with an 'INFO' value access to the parsed INFO field and typed values of the most used
+    keys. Parsing happens the first time the INFO field is needed and is shared between records with the same value.
+    """
+    __slots__ = ()
+
+    @property
+    def info(self):
+        return parse_info(self["INFO"])
+
+    @property
+    def end(self):
+        return self._int_info("END")
+
+    @property
+    def svtype(self):
+        return self.info.get("SVTYPE")
+
+    @property
+    def inschrom(self):
+        return self.info.get("INSCHROM")
+
+    @property
+    def inspos(self):
+        return self._int_info("INSPOS")
+
+    def _int_info(self, name):
+        value = self.info.get(name)
+        if value is None:
+            return None
+        return int(value)
+
+
+class StreamRecord(InfoAccessors, dict):
+    """
+    Dictionary holding one row of a streamed file, with the INFO accessors of the records of a ColumnStore.
+    """
+    __slots__ = ()
+
+
+class ExternalSorter:
+
+    def __init__(self, key, memory_budget=DEFAULT_MEMORY_BUDGET, temp_dir=None):
+        """
+        Class that sorts lines that do not have to fit in memory. Lines are collected until the memory budget is used,
+        then they are sorted and written as a run to a temporary file. At the end all runs are merged with a k-way merge.
+        The sort is stable, lines with the same key stay in the order they where added.
+        :param key: Function that takes a line and returns the value to sort on.
+        :param memory_budget: Approximate amount of bytes of lines to keep in memory.
+        :param temp_dir: Directory for the temporary files, the default temporary directory if not given.
+        :param buffer: List of lines that are not yet written to a run.
+        :param runs: List of temporary files or lists in memory containing sorted runs.
+        """
+        self.key = key
+        self.memory_budget = memory_budget
+        self.temp_dir = temp_dir
+        self.buffer = []
+        self.buffer_size = 0
+        self.runs = []
+        self.run_memory = 0
+
+    def add(self, line):
+        """
+        Function that adds a line to the sorter.
+        :param line: String ending with a newline.
+        """
+        self.buffer.append(line)
+        # rough estimate of the size of a string object
+        self.buffer_size += len(line) + 50
+        if self.buffer_size >= self.memory_budget:
+            self.write_run()
+
+    def write_run(self):
+        """
+        Function that sorts the buffer and writes it to a temporary file.
+        """
+        self.buffer.sort(key=self.key)
+        run = tempfile.TemporaryFile("w+", dir=self.temp_dir)
+        run.writelines(self.buffer)
+        run.seek(0)
+        self.runs.append(run)
+        self.buffer = []
+        self.buffer_size = 0
+
+    def add_sorted_run(self, lines):
+        """
+        Function that adds lines that are already sorted as a run of their own. The run is kept in memory if it fits in
+        the memory budget and written to a temporary file otherwise. Runs are merged in the order they were added, so
+        the result is the same as adding the lines one by one.
+        :param lines: List of strings ending with a newline, sorted on the key of the sorter.
+        """
+        if self.buffer:
+            self.write_run()
+        run_size = sum(len(line) for line in lines) + 50 * len(lines)
+        if self.run_memory + run_size <= self.memory_budget:
+            self.runs.append(lines)
+            self.run_memory += run_size
+            return
+        run = tempfile.TemporaryFile("w+", dir=self.temp_dir)
+        run.writelines(lines)
+        run.seek(0)
+        self.runs.append(run)
+
+    def sorted_lines(self):
+        """
+        Generator that gives all lines that where added in sorted order.
+        :return: Strings containing the lines.
+        """
+        if not self.runs:
+            self.buffer.sort(key=self.key)
+            return iter(self.buffer)
+        if self.buffer:
+            self.write_run()
+        return heapq.merge(*self.runs, key=self.key)
+
+    def close(self):
+        """
+        Function that removes the temporary files.
+        """
+        for run in self.runs:
+            if not isinstance(run, list):
+                run.close()
+        self.runs = []
+        self.run_memory = 0
+        self.buffer = []
+
+
+def take(column, rows):
+    """
+    :param column: List of values or CodedColumn.
+    :param rows: List of row ids.
+    :return: List of the values of the rows.
+    """
+    if isinstance(column, CodedColumn):
+        return column.take(rows)
+    return list(map(column.__getitem__, rows))
+
+
+# a column is saved as codes when at most 1 in this many rows has a value that no row before it had.
+CODED_COLUMN_RATIO = 4
+
+# the codes of a CodedColumn are 2 byte integers.
+MAX_CODES = 2 ** 16
+
+
+class CodedColumn:
+    __slots__ = ("codes", "categories", "category_codes", "plain")
+
+    def __init__(self, values):
+        """
+        Class for a column of a ColumnStore with few different values, like CHROM, REF, FILTER and ALT of a vcf file or
+        Allele, Feature_type and Consequence of a vep file. Every row has a 2 byte code into the list of different
+        values instead of an 8 byte reference to its value. It is used like the list of values it replaces, when more
+        different values are set than fit in the codes it turns into that list.
+        :param values: List of the values of the column, None for rows without a value. It can have at most MAX_CODES
+        - 1 different values.
+        :param codes: array with the code of the value of every row.
+        :param categories: List of the different values, the position of a value is its code. Code 0 is None.
+        :param category_codes: Dictionary of the different values to their code.
+        :param plain: List of the values of every row once the codes ran out, otherwise None.
+        """
+        self.categories = [None] + [value for value in dict.fromkeys(values) if value is not None]
+        self.category_codes = {value: code for code, value in enumerate(self.categories)}
+        self.plain = None
+        self.codes = array("H", map(self.category_codes.__getitem__, values))
+
+    def code(self, value):
+        """
+        :param value: String or None.
+        :return: Integer code of the value, a value that is new to the column gets the next code. None if there is no
+        code left for a new value.
+        """
+        code = self.category_codes.get(value)
+        if code is None:
+            code = len(self.categories)
+            if code == MAX_CODES:
+                return None
+            self.categories.append(value)
+            self.category_codes[value] = code
+        return code
+
+    def take(self, rows):
+        """
+        :param rows: List of row ids.
+        :return: List of the values of the rows.
+        """
+        if self.plain is None:
+            return list(map(self.categories.__getitem__, map(self.codes.__getitem__, rows)))
+        return take(self.plain, rows)
+
+    def to_plain(self):
+        """
+        Function that replaces the codes by a list of the values of every row.
+        """
+        self.plain = [self.categories[code] for code in self.codes]
+        self.codes = self.categories = self.category_codes = None
+
+    def append(self, value):
+        if self.plain is None:
+            code = self.code(value)
+            if code is not None:
+                self.codes.append(code)
+                return
+            self.to_plain()
+        self.plain.append(value)
+
+    def __getitem__(self, row):
+        if self.plain is None:
+            return self.categories[self.codes[row]]
+        return self.plain[row]
+
+    def __setitem__(self, row, value):
+        if self.plain is None:
+            code = self.code(value)
+            if code is not None:
+                self.codes[row] = code
+                return
+            self.to_plain()
+        self.plain[row] = value
+
+    def __len__(self):
+        if self.plain is None:
+            return len(self.codes)
+        return len(self.plain)
+
+
+class ColumnStore:
+
+    def __init__(self, keyed=False):
+        """
+        Class that saves the rows of a vcf or vep file column wise. Every column is a list of interned strings and a
+        row is an integer index into these lists, this takes a lot less memory then a dictionary for every row. After
+        compact the columns with few different values are CodedColumns. The class behaves like the dictionary of
+        dictionaries that was used before, retrieving a row gives a VcfRecord that reads and writes straight into the
+        columns.
+        :param keyed: Boolean telling if the rows are saved under a key (like an ID). If not the keys are the integer
+        row ids.
+        :param columns: Dictionary with column names as keys and lists of values or CodedColumns as values. A value of
+        None means the row has no value for that column.
+        :param row_keys: List containing the key of every row id, None if the row was deleted.
+        :param index: Dictionary linking keys to row ids, only used if keyed is True.
+        """
+        self.keyed = keyed
+        self.columns = {}
+        self.row_keys = []
+        self.index = {}
+        self.size = 0
+
+    def add_columns(self, names):
+        """
+        Function that makes sure a list exists for every column name given.
+        :param names: List of column names.
+        """
+        for name in names:
+            if name not in self.columns:
+                self.columns[name] = [None] * len(self.row_keys)
+
+    def compact(self):
+        """
+        Function that turns the columns in which most rows repeat a value of an earlier row into CodedColumns, like
+        CHROM, REF, FILTER and ALT. Columns with mostly unique values, like ID, POS and INFO, stay lists of strings.
+        """
+        for name, column in self.columns.items():
+            if isinstance(column, list):
+                different = len(set(column))
+                if different < MAX_CODES and different * CODED_COLUMN_RATIO <= len(column):
+                    self.columns[name] = CodedColumn(column)
+
+    def append_row(self, values, key=None):
+        """
+        Function that adds a new row to the store.
+        :param values: List of values in the same order as the column names were added or a dictionary of column names
+        and values.
+        :param key: The key to save the row under. When the store is not keyed the row id is used.
+        :return: Integer that is the row id of the new row.
+        """
+        row = len(self.row_keys)
+        if not self.keyed:
+            key = row
+        self.row_keys.append(key)
+        if self.keyed:
+            self.index[key] = row
+        self.size += 1
+        if isinstance(values, dict):
+            for column in self.columns.values():
+                column.append(None)
+            self.set_values(row, values)
+        else:
+            # pad rows that are shorter than the column header
+            values = list(map(sys.intern, values[:len(self.columns)]))
+            values += [None] * (len(self.columns) - len(values))
+            for column, value in zip(self.columns.values(), values):
+                column.append(value)
+        return row
+
+    def set_row(self, key, values):
+        """
+        Function that saves a row under a key, replacing the row that was saved under that key if there is one.
+        :param key: The key of the row.
+        :param values: List of values or dictionary of column names and values.
+        """
+        row = self.row_id(key, None)
+        if row is None:
+            self.append_row(values, key)
+        else:
+            for column in self.columns.values():
+                column[row] = None
+            self.set_values(row, values)
+
+    def set_values(self, row, values):
+        """
+        Function that sets multiple values of a row.
+        :param row: Integer row id.
+        :param values: List of values in the same order as the columns or dictionary of column names and values.
+        """
+        if isinstance(values, dict):
+            for name, value in values.items():
+                self.set_value(row, name, value)
+        else:
+            for column, value in zip(self.columns.values(), values):
+                column[row] = sys.intern(value)
+
+    def set_value(self, row, name, value):
+        """
+        Function that sets a value of a row adding the column if it does not exist yet.
+        :param row: Integer row id.
+        :param name: Name of the column.
+        :param value: String that is the new value.
+        """
+        if name not in self.columns:
+            self.add_columns([name])
+        self.columns[name][row] = sys.intern(value)
+
+    def row_id(self, key, *default):
+        """
+        Function that looks up the row id for a key.
+        :param key: The key of the row.
+        :param default: Optional value to return instead of raising a KeyError.
+        :return: Integer row id.
+        """
+        if self.keyed:
+            row = self.index.get(key)
+        elif isinstance(key, int) and 0 <= key < len(self.row_keys) and self.row_keys[key] is not None:
+            row = key
+        else:
+            row = None
+        if row is None:
+            if default:
+                return default[0]
+            raise KeyError(key)
+        return row
+
+    def get_value(self, key, name):
+        """
+        Function that gives one value of a row without creating a VcfRecord for it.
+        :param key: The key of the row.
+        :param name: Name of the column.
+        :return: String that is the value. A KeyError is raised if the row or the value does not exist.
+        """
+        value = self.columns[name][self.row_id(key)]
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def row_ids(self):
+        """
+        :return: List of all row ids that are not deleted in the order they where added.
+        """
+        return [row for row, key in enumerate(self.row_keys) if key is not None]
+
+######## MAGIC METHODS #############
+# these methods are here to make the store behave as a dictionary of dictionaries.
+
+    def keys(self):
+        return [key for key in self.row_keys if key is not None]
+
+    def values(self):
+        return [VcfRecord(self, row) for row in self.row_ids()]
+
+    def items(self):
+        return [(self.row_keys[row], VcfRecord(self, row)) for row in self.row_ids()]
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return self.size
+
+    def __contains__(self, key):
+        return self.row_id(key, None) is not None
+
+    def __setitem__(self, key, value):
+        if isinstance(value, VcfRecord):
+            value = value.copy()
+        if self.keyed:
+            self.set_row(key, value)
+        elif key in self:
+            self.set_row(key, value)
+        else:
+            self.append_row(value)
+
+    def __getitem__(self, key):
+        return VcfRecord(self, self.row_id(key))
+
+    def __delitem__(self, key):
+        row = self.row_id(key)
+        if self.keyed:
+            del self.index[key]
+        self.row_keys[row] = None
+        for column in self.columns.values():
+            column[row] = None
+        self.size -= 1
+
+
+class VcfRecord(InfoAccessors):
+    __slots__ = ("store", "row")
+
+    def __init__(self, store, row):
+        """
+        Class that is a view on one row of a ColumnStore. It behaves like the dictionary that was used for a row before,
+        values that are set are directly written into the columns of the store. The parsed INFO field and its typed
+        values are available trough the InfoAccessors.
+        :param store: The ColumnStore the row is part of.
+        :param row: Integer row id of the row.
+        """
+        self.store = store
+        self.row = row
+
+    def get(self, name, default=None):
+        try:
+            return self[name]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return [name for name, column in self.store.columns.items() if column[self.row] is not None]
+
+    def items(self):
+        return [(name, self[name]) for name in self.keys()]
+
+    def copy(self):
+        """
+        :return: Dictionary containing the column names and values of this row, changing it does not change the store.
+        """
+        return dict(self.items())
+
+    def __contains__(self, name):
+        return name in self.store.columns and self.store.columns[name][self.row] is not None
+
+    def __getitem__(self, name):
+        value = self.store.columns[name][self.row]
+        if value is None:
+            raise KeyError(name)
+        return value
+
+    def __setitem__(self, name, value):
+        self.store.set_value(self.row, name, value)
+
+    def __repr__(self):
+        return "VcfRecord({})".format(self.copy())
@@ -0,0 +1,773 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+import re
+import hashlib
+import threading
+import numpy as np
+import pandas as pd
+import vcf_analyser as vcfa
+from os import path, replace, stat
+from collections import OrderedDict
+from functools import lru_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+except ImportError:
+    # without pyarrow there is no cache and the vep file is read every time
+    pa = None
+    feather = None
+
+# names of the vep columns as they are displayed.
+VEP_COLUMN_NAMES = {"#Uploaded_variation": "ID", "cDNA_position": "cDNA position", "CDS_position": "CDS position",
+                    "Protein_position": "Protein position", "Amino_acids": "Amino acids",
+                    "Existing_variation": "Existing variation", "Feature_type": "Feature type"}
+
+# columns parsed from the Location column that are kept next to the table.
+LOCATION_COLUMNS = ["Location chromosome", "Location start", "Location end"]
+
+# columns with positions that are integers or - when there is no position, read as nullable integers where possible.
+POSITION_COLUMNS = ["cDNA position", "CDS position", "Protein position"]
+
+# text columns with at most this fraction of unique values are kept as categoricals.
+CATEGORY_RATIO = 0.5
+
+# changing this invalidates all caches, for when the content of the cache changes.
+CACHE_VERSION = 3
+
+
+def read_vep_table(vep_file, header_end):
+    """
+    Function that reads the vep file created by correct_vep.py and parses the locations.
+    :param vep_file: Location of the vep file.
+    :param header_end: Amount of header lines before the column header.
+    :return: pandas Dataframe of the table with the displayed column names and the row positions as index, and a pandas
+    Dataframe with the LOCATION_COLUMNS parsed from the Location column.
+    """
+    df = pd.read_csv(vep_file, sep="\t", skiprows=range(header_end), header=0, index_col=False)
+    df = df.rename(columns=VEP_COLUMN_NAMES).reset_index(drop=True)
+    locations = parse_locations(df["Location"])
+    before = df.memory_usage(deep=True, index=False)
+    df = convert_dtypes(df)
+    print(memory_report(before, df.memory_usage(deep=True, index=False)))
+    return df, locations
+
+
+def convert_dtypes(df):
+    """
+    Function that gives the text columns of the table a compact type. Position columns that only hold integers and -
+    become nullable integers with - as missing value, text columns that repeat their values become categoricals with
+    the categories in alphabetical order so sorting them stays alphabetical.
+    :param df: pandas Dataframe of the table as read by pandas.
+    :return: pandas Dataframe with the converted columns.
+    """
+    converted = {}
+    for col_name in df.columns:
+        values = df[col_name]
+        if not pd.api.types.is_string_dtype(values):
+            converted[col_name] = values
+            continue
+        if col_name in POSITION_COLUMNS:
+            positions = values.where(values != "-")
+            if positions.notna().any() and positions.dropna().str.fullmatch(r"\d+").all():
+                converted[col_name] = pd.to_numeric(positions).astype("Int64")
+                continue
+        if values.nunique() <= CATEGORY_RATIO * len(values):
+            converted[col_name] = values.astype("category")
+        else:
+            converted[col_name] = values
+    return pd.DataFrame(converted)
+
+
+def memory_report(before, after):
+    """
+    :param before: pandas Series with the bytes used by every column before converting.
+    :param after: pandas Series with the bytes used by every column after converting.
+    :return: String containing a table of the megabytes used by every column before and after converting.
+    """
+    lines = ["{:<22}{:>12}{:>12}".format("column", "before MB", "after MB")]
+    for col_name in before.index:
+        lines.append("{:<22}{:>12.1f}{:>12.1f}".format(col_name, before[col_name] / 1024 ** 2,
+                                                       after[col_name] / 1024 ** 2))
+    lines.append("{:<22}{:>12.1f}{:>12.1f}".format("total", before.sum() / 1024 ** 2, after.sum() / 1024 ** 2))
+    return "\n".join(lines)
+
+
+def load_vep_table(vep_file, header_end, use_cache=True):
+    """
+    Function that loads the vep table from a cache next to the vep file if there is one for this version of the file,
+    otherwise the vep file is read and the cache is written. The cache is a Feather file that is memory mapped when it
+    is read, so the workers of a WSGI server that load the same table share its pages. This needs pyarrow, without
+    pyarrow the vep file is read every time.
+    :param vep_file: Location of the vep file.
+    :param header_end: Amount of header lines before the column header.
+    :param use_cache: Boolean telling if the cache should be used.
+    :return: The table and the parsed locations like read_vep_table.
+    """
+    if feather is None or not use_cache:
+        return read_vep_table(vep_file, header_end)
+    cache_file = cache_location(vep_file)
+    key = source_key(vep_file)
+    cached = read_cache(cache_file, key)
+    if cached is not None:
+        return cached
+    df, locations = read_vep_table(vep_file, header_end)
+    write_cache(cache_file, key, df, locations)
+    # the parsed table is dropped for the memory mapped cache, so the process that made the cache shares its pages too
+    cached = read_cache(cache_file, key)
+    if cached is not None:
+        return cached
+    return df, locations
+
+
+def cache_location(vep_file):
+    """
+    :param vep_file: Location of the vep file.
+    :return: Location of the cache, a hidden file next to the vep file so it is not mistaken for a vep file.
+    """
+    directory, file_name = path.split(vep_file)
+    return path.join(directory, ".{}.feather".format(file_name))
+
+
+def source_key(vep_file, sample_size=1024 ** 2):
+    """
+    Function that creates a key that changes when the vep file changes. Hashing the whole file would take as long as
+    reading it, so the size, modification time and a hash of the start, middle and end of the file are used.
+    :param vep_file: Location of the vep file.
+    :param sample_size: Amount of bytes hashed at every sampled position.
+    :return: String containing the key.
+    """
+    file_stat = stat(vep_file)
+    sha = hashlib.sha1()
+    with open(vep_file, "rb") as f:
+        for offset in (0, file_stat.st_size // 2, max(file_stat.st_size - sample_size, 0)):
+            f.seek(offset)
+            sha.update(f.read(sample_size))
+    return "{}-{}-{}-{}".format(CACHE_VERSION, file_stat.st_size, file_stat.st_mtime_ns, sha.hexdigest())
+
+
+def read_cache(cache_file, key):
+    """
+    :param cache_file: Location of the cache.
+    :param key: The source_key of the vep file.
+    :return: The table and the parsed locations like read_vep_table, None if there is no cache or the cache was made
+    for a different version of the vep file.
+    """
+    if not path.exists(cache_file):
+        return None
+    try:
+        table = feather.read_table(cache_file, memory_map=True)
+    except (OSError, pa.ArrowInvalid):
+        return None
+    metadata = table.schema.metadata or {}
+    if metadata.get(b"vep_source_key") != key.encode():
+        return None
+    return table_to_pandas(table.drop(LOCATION_COLUMNS)), table_to_pandas(table.select(LOCATION_COLUMNS))
+
+
+def table_to_pandas(table):
+    """
+    Function that turns a memory mapped table of the cache into a pandas Dataframe that uses the memory of the file
+    where it can, so processes that read the same cache share these pages. Numeric columns and the codes of categorical
+    columns stay views of the file. The categories are made from the dictionary of the column directly, pyarrow would
+    combine all columns of a type into one copy and makes python strings of the categories first. The other columns
+    are converted by pyarrow with the pandas metadata of the cache, so they get their dtype back, like the nullable
+    integers of the position columns.
+    :param table: pyarrow Table read from the cache.
+    :return: pandas Dataframe of the table.
+    """
+    categorical = [name for name, column in zip(table.column_names, table.columns)
+                   if pa.types.is_dictionary(column.type) and column.num_chunks == 1]
+    others = table.drop(categorical).to_pandas(split_blocks=True)
+    columns = {}
+    for name in table.column_names:
+        if name in categorical:
+            chunk = table.column(name).chunk(0)
+            codes = chunk.indices.fill_null(-1).to_numpy(zero_copy_only=False)
+            columns[name] = pd.Categorical.from_codes(codes, categories=pd.Index(chunk.dictionary.to_pandas()))
+        else:
+            columns[name] = others[name]
+    return pd.DataFrame(columns, columns=table.column_names, copy=False)
+
+
+def write_cache(cache_file, key, df, locations):
+    """
+    Function that writes the table and the parsed locations to the cache. The file is written uncompressed so it can be
+    memory mapped and is moved in place when it is complete, so a half written cache is never read. If the directory is
+    not writable there simply is no cache.
+    :param cache_file: Location of the cache.
+    :param key: The source_key of the vep file.
+    :param df: The table.
+    :param locations: The parsed locations.
+    """
+    table = pa.Table.from_pandas(pd.concat([df, locations], axis=1), preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[b"vep_source_key"] = key.encode()
+    table = table.replace_schema_metadata(metadata)
+    try:
+        # one chunk so every categorical column has one dictionary, the dictionaries of multiple chunks would have to
+        # be combined into a new copy of the column when the cache is read.
+        feather.write_feather(table, cache_file + ".tmp", compression="uncompressed", chunksize=max(len(table), 1))
+        replace(cache_file + ".tmp", cache_file)
+    except OSError as error:
+        print("WARNING could not write the cache {}: {}".format(cache_file, error))
+
+
+def parse_locations(locations):
+    """
+    Function that parses the Location column into the chromosome, start and end.
+    :param locations: pandas Series of locations in genome browser syntax (1:5-10 or 1:5 for insertions).
+    :return: pandas Dataframe with the LOCATION_COLUMNS. The chromosome is a categorical with the chromosomes in order
+    of first appearance, it is missing for locations that could not be parsed. For insertions the end is the start.
+    """
+    chrom_parts = locations.str.partition(":")
+    position_parts = chrom_parts[2].str.partition("-")
+    starts = pd.to_numeric(position_parts[0], errors="coerce")
+    ends = pd.to_numeric(position_parts[2].where(position_parts[1] == "-", position_parts[0]), errors="coerce")
+    invalid = (starts.isna() | ends.isna()).values
+    codes, uniques = pd.factorize(chrom_parts[0])
+    codes[invalid] = -1
+    return pd.DataFrame({LOCATION_COLUMNS[0]: pd.Categorical.from_codes(codes, uniques),
+                         LOCATION_COLUMNS[1]: starts.fillna(0).values.astype(np.int64),
+                         LOCATION_COLUMNS[2]: ends.fillna(0).values.astype(np.int64)})
+
+
+class LocationIndex:
+
+    def __init__(self, locations):
+        """
+        Class that holds the Location column of a vep table as integer arrays, so region searches do not have to
+        split location strings again. For every chromosome the rows are kept sorted on start, a region is then found
+        with a binary search on the starts followed by a check of the ends of the rows in range.
+        :param locations: pandas Dataframe with the LOCATION_COLUMNS as created by parse_locations, the positions in
+        this dataframe are the row positions everything is indexed on.
+        :param chromosomes: List of the chromosome names in order of first appearance.
+        :param chrom_codes: Array with for every row the position of its chromosome in chromosomes, -1 for locations
+        that could not be parsed.
+        :param starts: Array with the start of every row.
+        :param ends: Array with the end of every row, for insertions the end is the start.
+        :param sorted_rows: Dictionary of chromosome code to the row positions of that chromosome sorted on start.
+        :param sorted_starts: Dictionary of chromosome code to the starts belonging to sorted_rows.
+        :param ranks: Array with for every row its rank when sorting on chromosome, start and end. Rows with the same
+        location have the same rank, rows with a location that could not be parsed come last.
+        """
+        chromosomes = locations[LOCATION_COLUMNS[0]]
+        self.chromosomes = list(chromosomes.cat.categories)
+        self.chrom_codes = chromosomes.cat.codes.values.astype(np.int32)
+        self.starts = locations[LOCATION_COLUMNS[1]].values.astype(np.int64)
+        self.ends = locations[LOCATION_COLUMNS[2]].values.astype(np.int64)
+        self.code_by_name = {chrom: code for code, chrom in enumerate(self.chromosomes)}
+        self.sorted_rows = {}
+        self.sorted_starts = {}
+        order = np.lexsort((self.starts, self.chrom_codes))
+        bounds = np.searchsorted(self.chrom_codes[order], np.arange(len(self.chromosomes) + 1))
+        for code in range(len(self.chromosomes)):
+            rows = order[bounds[code]:bounds[code + 1]]
+            self.sorted_rows[code] = rows
+            self.sorted_starts[code] = self.starts[rows]
+        self.ranks = self.location_ranks()
+
+    def __len__(self):
+        return len(self.chrom_codes)
+
+    def location_ranks(self):
+        """
+        Function that ranks the rows on location. Numbered chromosomes come first in numerical order followed by the
+        other chromosomes in alphabetical order, within a chromosome the rows are sorted on start and then end.
+        :return: Array with the rank of every row, sorting on it gives the rows sorted on location.
+        """
+        chrom_order = sorted(range(len(self.chromosomes)), key=lambda code: vcfa.chromosome_key(self.chromosomes[code]))
+        chrom_ranks = np.empty(len(self.chromosomes) + 1, dtype=np.int64)
+        chrom_ranks[chrom_order] = np.arange(len(self.chromosomes))
+        # the code -1 of unparsed locations picks the last rank
+        chrom_ranks[-1] = len(self.chromosomes)
+        row_chrom_ranks = chrom_ranks[self.chrom_codes]
+        order = np.lexsort((self.ends, self.starts, row_chrom_ranks))
+        return dense_ranks(order, row_chrom_ranks, self.starts, self.ends)
+
+    def select(self, filter_value):
+        """
+        Function that selects the rows matching a location filter. Multiple regions can be given seperated by a comma,
+        a row matches if it matches any of them.
+        :param filter_value: String containing chromosomes or regions in genome browser syntax eg. 1:100-500,3.
+        :return: Boolean array with a value for every row telling if it matches the filter.
+        """
+        mask = np.zeros(len(self), dtype=bool)
+        for region in filter_value.split(","):
+            mask[self.region_rows(region)] = True
+        return mask
+
+    def region_rows(self, region):
+        """
+        Function that finds the rows of one region. A chromosome on its own selects all rows of that chromosome, with a
+        start and end only the rows that are completely within the region are selected.
+        :param region: String containing a chromosome or a region in genome browser syntax eg. 1:100-500.
+        :return: Array of the positions of the rows in the region, empty for regions that can not be parsed.
+        """
+        empty = np.array([], dtype=np.int64)
+        chrom, has_positions, positions = region.partition(":")
+        code = self.code_by_name.get(chrom)
+        if code is None:
+            return empty
+        if not has_positions:
+            return self.sorted_rows[code]
+        try:
+            start, end = (int(value) for value in positions.split("-"))
+        except ValueError:
+            # no integers or not exactly one - in the region
+            return empty
+        starts = self.sorted_starts[code]
+        rows = self.sorted_rows[code][np.searchsorted(starts, start, "left"):np.searchsorted(starts, end, "right")]
+        return rows[self.ends[rows] <= end]
+
+
+def dense_ranks(order, *keys):
+    """
+    Function that turns the order of rows sorted on one or more keys into ranks, rows with the same values for all keys
+    get the same rank.
+    :param order: Array of row positions in sorted order.
+    :param keys: Arrays with a value for every row that where used for sorting.
+    :return: Array with the rank of every row.
+    """
+    new_value = np.zeros(len(order), dtype=bool)
+    new_value[:1] = True
+    for key in keys:
+        sorted_key = key[order]
+        new_value[1:] |= sorted_key[1:] != sorted_key[:-1]
+    ranks = np.empty(len(order), dtype=np.int64)
+    ranks[order] = np.cumsum(new_value) - 1
+    return ranks
+
+
+def id_ranks(ids):
+    """
+    Function that ranks IDs. Numbered IDs are sorted as numbers and come before the other IDs, that are sorted
+    alphabetically. The insertions created for dispersed duplications have a .i appendage and come right after the
+    duplication they belong to.
+    :param ids: Array of unique IDs.
+    :return: Array with the rank of every ID.
+    """
+    ids = pd.Series(ids, dtype=object).astype(str)
+    inserted = ids.str.endswith(".i").values
+    base = ids.where(~inserted, ids.str[:-2])
+    is_text = ~base.str.fullmatch(r"[+-]?\d+").values.astype(bool)
+    numbers = np.zeros(len(ids), dtype=np.int64)
+    numbers[~is_text] = base[~is_text].astype(np.int64).values
+    text_ranks = np.zeros(len(ids), dtype=np.int64)
+    text_ranks[is_text] = np.unique(base[is_text].values.astype(str), return_inverse=True)[1]
+    order = np.lexsort((inserted, text_ranks, numbers, is_text))
+    return dense_ranks(order, is_text, numbers, text_ranks, inserted)
+
+
+# all consequences vep can annotate in order of severity, note that some of these are most likely never annotated.
+CONSEQUENCE_TERMS = ['transcript_ablation', 'splice_acceptor_variant', 'splice_donor_variant', 'stop_gained',
+                     'frameshift_variant', 'stop_lost', 'start_lost', 'transcript_amplification', 'inframe_insertion',
+                     'inframe_deletion', 'missense_variant', 'protein_altering_variant', 'splice_region_variant',
+                     'incomplete_terminal_codon_variant', 'start_retained_variant', 'stop_retained_variant',
+                     'synonymous_variant', 'coding_sequence_variant', 'mature_miRNA_variant', '5_prime_UTR_variant',
+                     '3_prime_UTR_variant', 'non_coding_transcript_exon_variant', 'intron_variant',
+                     'NMD_transcript_variant', 'non_coding_transcript_variant', 'upstream_gene_variant',
+                     'downstream_gene_variant', 'TFBS_ablation', 'TFBS_amplification', 'TF_binding_site_variant',
+                     'regulatory_region_ablation', 'regulatory_region_amplification', 'feature_elongation',
+                     'regulatory_region_variant', 'feature_truncation', 'intergenic_variant']
+
+# the bitmask is a 64 bit integer, terms after the first 64 in the vocabulary are not indexed.
+MAX_CONSEQUENCE_TERMS = 64
+
+
+class ConsequenceIndex:
+
+    def __init__(self, consequences):
+        """
+        Class that encodes the Consequence column as a bitmask over the vocabulary of consequence terms, every bit
+        telling if a row has that term. Rows only have a handful of different consequence combinations, so the masks
+        are calculated once per combination and rows refer to their combination by a code. Counting and filtering is
+        done on the combinations and mapped back to the rows.
+        :param consequences: pandas Series of comma seperated consequence terms, the positions in this series are the
+        row positions everything is indexed on.
+        :param terms: List of the terms in the vocabulary, CONSEQUENCE_TERMS followed by other terms found in the data.
+        :param codes: Array with for every row the code of its combination, -1 for rows without a consequence.
+        :param combo_bits: Array with the bitmask of every combination.
+        :param combo_strings: List of the consequence strings of every combination.
+        :param term_matrix: Boolean matrix of combinations by terms telling which terms a combination has.
+        :param unindexed_terms: List of the terms found in the data that did not fit in the bitmask.
+        """
+        codes, uniques = pd.factorize(consequences)
+        self.codes = codes.astype(np.int32)
+        self.combo_strings = list(uniques)
+        combo_terms = [value.split(",") for value in self.combo_strings]
+        self.terms = list(CONSEQUENCE_TERMS)
+        known = set(self.terms)
+        for term_list in combo_terms:
+            for term in term_list:
+                if term and term not in known:
+                    known.add(term)
+                    self.terms.append(term)
+        self.unindexed_terms = self.terms[MAX_CONSEQUENCE_TERMS:]
+        self.terms = self.terms[:MAX_CONSEQUENCE_TERMS]
+        self.term_bits = {term: 1 << bit for bit, term in enumerate(self.terms)}
+        self.combo_bits = np.array([sum(self.term_bits.get(term, 0) for term in set(term_list))
+                                    for term_list in combo_terms], dtype=np.uint64)
+        self.term_matrix = ((self.combo_bits[:, None] >> np.arange(len(self.terms), dtype=np.uint64)) &
+                            np.uint64(1)).astype(bool)
+
+    @property
+    def bits(self):
+        """
+        :return: Array with the bitmask of every row, 0 for rows without a consequence.
+        """
+        # the code -1 of rows without a consequence picks the appended value
+        return np.append(self.combo_bits, np.uint64(0))[self.codes]
+
+    def count(self, rows):
+        """
+        Function that counts for every term the amount of rows that have that term.
+        :param rows: Array of the positions of the rows that are counted.
+        :return: Array with the amount of rows for every term in terms.
+        """
+        codes = self.codes[rows]
+        counts = np.bincount(codes[codes >= 0], minlength=len(self.combo_strings))
+        return counts @ self.term_matrix
+
+    def select(self, filter_value):
+        """
+        Function that turns a consequence filter into a mask of the rows that match it. A value seperated by a , is an
+        OR, seperated by a + is an AND and a ! in front excludes the rows. The , binds stronger than the + like in
+        compile_filter, so a,b+c means (a or b) and c. The filter is done once for every combination and mapped back to
+        the rows.
+        :param filter_value: String containing the filter expression without the column name.
+        :return: Boolean array with a value for every row telling if it matches the filter.
+        """
+        exclude = filter_value.startswith("!")
+        if exclude:
+            filter_value = filter_value[1:]
+        all_of = []
+        for part in filter_value.split("+"):
+            all_of.append(np.logical_or.reduce([self.value_match(value) for value in part.split(",")]))
+        combo_match = np.logical_and.reduce(all_of)
+        if exclude:
+            combo_match = ~combo_match
+        # rows without a consequence never match, also not when excluding. Their code -1 picks the appended False.
+        return np.append(combo_match, False)[self.codes]
+
+    def value_match(self, value):
+        """
+        Function that finds the combinations that match one value of a filter. A value that is a term only matches that
+        term, so coding_sequence_variant does not match a longer term that contains it. Other values match the terms
+        they are part of, like 'frameshift' matches frameshift_variant. Regular expressions and values that are part of
+        terms that are not indexed are matched on the text of the combinations.
+        :param value: One value of a filter expression.
+        :return: Boolean array with a value for every combination telling if it matches the value.
+        """
+        if value in self.term_bits:
+            return (self.combo_bits & np.uint64(self.term_bits[value])) != 0
+        if value in self.unindexed_terms:
+            return np.array([value in combo.split(",") for combo in self.combo_strings], dtype=bool)
+        value_mask = self.value_mask(value)
+        if value_mask is not None:
+            return (self.combo_bits & np.uint64(value_mask)) != 0
+        return compile_value(value).evaluate(pd.Series(self.combo_strings, dtype=object))
+
+    def value_mask(self, value):
+        """
+        :param value: Part of a term.
+        :return: The bitmask of all terms that contain the value, None if no term contains it, if it is part of a term
+        that is not indexed or if it is a regular expression.
+        """
+        if not value or not re.fullmatch(r"\w+", value):
+            return None
+        if any(value in term for term in self.unindexed_terms):
+            return None
+        value_mask = 0
+        for term, bit in self.term_bits.items():
+            if value in term:
+                value_mask |= bit
+        return value_mask or None
+
+
+# names of the types of cnvs in the order they are counted in.
+TYPE_NAMES = ["insertion", "deletion", "dispersed duplication", "tandem duplication"]
+
+
+class VariantIndex:
+
+    def __init__(self, df, location_index):
+        """
+        Class that holds a table with one row per variant, a vep table has a row for every transcript a variant
+        overlaps. Every row of the vep table is mapped to its variant, so counts per variant of any selection of rows
+        come from one bincount over the variant codes instead of dropping duplicates and scanning the text.
+        :param df: pandas Dataframe of the vep table with the ID, Allele and INFO columns, without white spaces added.
+        :param location_index: LocationIndex of the same table, the chromosome of a variant is taken from it.
+        :param row_variant: Array with for every row of the vep table the position of its variant in variants.
+        :param variants: pandas Dataframe with the ID, the Type and the Chromosome of every variant as categoricals,
+        and if the variant is an insertion created for a dispersed duplication. Those are not counted because the
+        duplication itself is counted.
+        :param id_ranks: Array with for every row of the vep table the rank of its ID as given by id_ranks.
+        """
+        codes, ids = pd.factorize(df["ID"])
+        self.row_variant = codes.astype(np.int32)
+        first_rows = np.unique(codes, return_index=True)[1]
+        allele = df["Allele"].iloc[first_rows].reset_index(drop=True)
+        info = df["INFO"].iloc[first_rows].astype(object).fillna("").astype(str).reset_index(drop=True)
+        self.type_codes = np.select([allele == "insertion", allele == "deletion",
+                                     info.str.contains("DUP:DISPERSED", regex=False),
+                                     info.str.contains("DUP:TANDEM", regex=False)],
+                                    range(len(TYPE_NAMES)), -1).astype(np.int8)
+        self.dispersed_insertion = info.str.contains("INS:DISPERSED", regex=False).values
+        self.type_codes[self.dispersed_insertion] = -1
+        self.chrom_codes = location_index.chrom_codes[first_rows]
+        self.variants = pd.DataFrame({
+            "ID": ids,
+            "Type": pd.Categorical.from_codes(self.type_codes, TYPE_NAMES),
+            "Chromosome": pd.Categorical.from_codes(self.chrom_codes, location_index.chromosomes),
+            "Dispersed insertion": self.dispersed_insertion})
+        self.id_ranks = id_ranks(ids)[self.row_variant]
+
+    def __len__(self):
+        return len(self.variants)
+
+    def selected_variants(self, rows):
+        """
+        :param rows: Array of the positions of the rows in the vep table.
+        :return: Boolean array telling for every variant if at least one of its rows is in rows and if it is not an
+        insertion created for a dispersed duplication.
+        """
+        return (np.bincount(self.row_variant[rows], minlength=len(self)) > 0) & ~self.dispersed_insertion
+
+    def count_types(self, rows):
+        """
+        :param rows: Array of the positions of the rows in the vep table.
+        :return: Array with the amount of variants of every type in TYPE_NAMES.
+        """
+        type_codes = self.type_codes[self.selected_variants(rows)]
+        return np.bincount(type_codes[type_codes >= 0], minlength=len(TYPE_NAMES))
+
+    def count_chromosomes(self, rows):
+        """
+        :param rows: Array of the positions of the rows in the vep table.
+        :return: Array with the amount of variants on every chromosome of the location index.
+        """
+        chrom_codes = self.chrom_codes[self.selected_variants(rows)]
+        return np.bincount(chrom_codes[chrom_codes >= 0], minlength=len(self.variants["Chromosome"].cat.categories))
+
+
+class LruCache:
+
+    def __init__(self, maxsize):
+        """
+        Class that keeps the results of the last maxsize different requests. When the cache is full the result that was
+        used the longest time ago is removed. The amount of hits and misses is counted so the size can be tuned.
+        :param maxsize: Maximum amount of results kept in the cache.
+        :param hits: Amount of times a requested result was in the cache.
+        :param misses: Amount of times a requested result was not in the cache.
+        """
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.entries = OrderedDict()
+        # dash handles requests in multiple threads
+        self.lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """
+        :param key: Key of the result.
+        :param default: Value returned when the result is not in the cache.
+        :return: The cached result, or default when there is none.
+        """
+        with self.lock:
+            if key in self.entries:
+                self.hits += 1
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            self.misses += 1
+            return default
+
+    def put(self, key, value):
+        """
+        Function that adds a result to the cache and removes the least recently used result if the cache is full.
+        :param key: Key of the result.
+        :param value: The result.
+        """
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        :return: Dictionary with the amount of hits, misses and results in the cache and the maximum size.
+        """
+        with self.lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self.entries), "maxsize": self.maxsize}
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# characters that make a filter value a regular expression, values without them are searched as plain text.
+REGEX_CHARACTERS = set(".^$*?{}[]\\|()")
+
+
+class Contains:
+    """
+    Filter expression matching the values that contain a text.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    def evaluate(self, values):
+        return values.str.contains(self.text, regex=False).values
+
+    def __repr__(self):
+        return "Contains({!r})".format(self.text)
+
+
+class Matches:
+    """
+    Filter expression matching the values in which a regular expression is found.
+    """
+    def __init__(self, pattern):
+        self.pattern = pattern
+
+    def evaluate(self, values):
+        return values.str.contains(self.pattern).values
+
+    def __repr__(self):
+        return "Matches({!r})".format(self.pattern.pattern)
+
+
+class AnyOf:
+    """
+    Filter expression matching the values that match at least one of its expressions.
+    """
+    def __init__(self, expressions):
+        self.expressions = expressions
+
+    def evaluate(self, values):
+        return np.logical_or.reduce([expression.evaluate(values) for expression in self.expressions])
+
+    def __repr__(self):
+        return "AnyOf({!r})".format(self.expressions)
+
+
+class AllOf:
+    """
+    Filter expression matching the values that match all of its expressions.
+    """
+    def __init__(self, expressions):
+        self.expressions = expressions
+
+    def evaluate(self, values):
+        return np.logical_and.reduce([expression.evaluate(values) for expression in self.expressions])
+
+    def __repr__(self):
+        return "AllOf({!r})".format(self.expressions)
+
+
+class Not:
+    """
+    Filter expression matching the values that do not match its expression.
+    """
+    def __init__(self, expression):
+        self.expression = expression
+
+    def evaluate(self, values):
+        return ~self.expression.evaluate(values)
+
+    def __repr__(self):
+        return "Not({!r})".format(self.expression)
+
+
+@lru_cache(maxsize=256)
+def compile_filter(filter_value):
+    """
+    Function that parses the value of a column filter into an expression. A ! at the start excludes the matches, a +
+    seperates values that all have to match and a , seperates values of which one has to match. The , binds stronger
+    than the + so a,b+c means (a or b) and c. Expressions are cached on the filter value, so the filter is only parsed
+    the first time it is used.
+    :param filter_value: String containing the filter expression without the column name.
+    :return: Expression with an evaluate function that takes a pandas Series of strings and returns a boolean array.
+    """
+    exclude = filter_value.startswith("!")
+    if exclude:
+        filter_value = filter_value[1:]
+    all_of = []
+    for part in filter_value.split("+"):
+        any_of = [compile_value(value) for value in part.split(",")]
+        all_of.append(any_of[0] if len(any_of) == 1 else AnyOf(any_of))
+    expression = all_of[0] if len(all_of) == 1 else AllOf(all_of)
+    return Not(expression) if exclude else expression
+
+
+def compile_value(value):
+    """
+    :param value: One value of a filter expression.
+    :return: Contains expression for plain text, Matches expression for regular expressions. Values that are not a
+    valid regular expression are searched as plain text.
+    """
+    if REGEX_CHARACTERS.isdisjoint(value):
+        return Contains(value)
+    try:
+        return Matches(re.compile(value))
+    except re.error:
+        return Contains(value)
+
+
+class TextIndex:
+
+    def __init__(self, df):
+        """
+        Class that filters the text of the columns of a vep table. Most columns have few different values compared to
+        the amount of rows, so every column is split into its unique values and a code per row the first time it is
+        filtered. A filter is evaluated once for every unique value and mapped back to the rows with the codes.
+        :param df: pandas Dataframe of the vep table, the row positions are what everything is indexed on.
+        :param columns: Dictionary of column name to the codes of the rows and the unique values as strings.
+        """
+        self.df = df
+        self.columns = {}
+
+    def column_values(self, col_name):
+        """
+        :param col_name: Name of the column.
+        :return: Array with the code of the value of every row, -1 for missing values, and a pandas Series of the
+        unique values as strings.
+        """
+        if col_name not in self.columns:
+            values = self.df[col_name]
+            codes, uniques = pd.factorize(values)
+            uniques = pd.Series(uniques).astype(str)
+            if col_name in POSITION_COLUMNS and pd.api.types.is_integer_dtype(values):
+                # positions read as integers are missing where vep wrote a -, they are filtered as the - that is shown
+                codes = np.where(codes == -1, len(uniques), codes)
+                uniques = pd.concat([uniques, pd.Series(["-"])], ignore_index=True)
+            self.columns[col_name] = codes, uniques
+        return self.columns[col_name]
+
+    def select(self, col_name, filter_value):
+        """
+        Function that filters a column with a filter expression.
+        :param col_name: Name of the column.
+        :param filter_value: String containing the filter expression without the column name.
+        :return: Boolean array telling for every row if it matches the filter. Missing values never match, also not
+        when excluding.
+        """
+        codes, uniques = self.column_values(col_name)
+        if len(uniques):
+            matches = compile_filter(filter_value).evaluate(uniques)
+        else:
+            matches = np.zeros(0, dtype=bool)
+        # the code -1 of missing values picks the appended False
+        return np.append(matches, False)[codes]
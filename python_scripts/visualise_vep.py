@@ -11,22 +11,46 @@ import dash_core_components as dcc
 import dash_html_components as html
 import plotly.graph_objs as go
 import dash_table
+import numpy as np
 import pandas as pd
+import argparse
 import subprocess
-from os import path, listdir, system, remove
+import threading
+import vep_table as vept
+import ontologizer_jobs as ontj
+import go_enrichment as goe
+from os import path, listdir, remove, walk, stat
 from dash.dependencies import Input, Output, State
 from io import StringIO
 from collections import OrderedDict
-from sys import argv
+from urllib.parse import quote, unquote
+from flask import jsonify
 
 #### innitial setup of global variables that do not change and are not supposed to be configurable
 # this external stylesheet has a MIT liscence to should be free to use.
 external_stylesheets = ['https://stackpath.bootstrapcdn.com/bootstrap/4.3.1/css/bootstrap.min.css']
-ontologizer_button_active = True
-# supress callback exceptions to make sure the setup function can run without layout warning interupting the building of
+# supress callback exceptions to make sure create_app can run without layout warning interupting the building of
 # the web interface.
 app = dash.Dash(__name__, external_stylesheets=external_stylesheets, suppress_callback_exceptions=True)
 
+# amount of filtered and sorted tables and of graphs that are kept in memory. Tables are kept as the positions of their
+# rows so paging and repeating a filter does not have to filter and sort again.
+query_cache_size = 32
+
+# ontologizer runs in the background, the page polls the job every ontologizer_poll_interval milliseconds.
+ontologizer_jobs = ontj.OntologizerJobs()
+ontologizer_poll_interval = 2000
+
+# the Dataset of the result directory the app shows, set by create_app.
+dataset = None
+# the DatasetStore of the result directories the app shows when it serves a root directory, set by create_multi_app.
+datasets = None
+# amount of datasets that stay loaded when the app serves a root directory.
+DEFAULT_MAX_DATASETS = 4
+
+# long columns that get white spaces after the , and ; on the shown page, so the dash table can multi-line them.
+WHITESPACE_COLUMNS = ["Consequence", "Extra", "INFO"]
+
 graph_colors = ["#FFC20A", "#0C7BDC", "#1AFF1A", "#4B0092", "#994F00", "#006CD1", "#FEFE62", "#D35FB7", "#E1BE6A",
                 "#40B0A6", \
                 "#005AB5", "#DC3220", "#E66100", "#5D3A9B", "#1A85FF", "#D41159", "#FFC20A", "#0C7BDC", "#1AFF1A", \
@@ -39,8 +63,8 @@ vep_table_explanation = """
 For sorting the table there is a filter box above each column. Avoid spaces in your searches. If you want to use spaces 
 surround your filter expression in quotes("). If you want to search with an OR operator use a "," to seperate the values for an 
 AND operter use a "+". If you want to invert the filter and exclude all the words instead start your filter with a "!". 
-Note the location column only supports the OR operator. Mixing the OR and AND operator is not recomended, and might give 
-unexpected results. For the location column you can search using genome browser syntax eg. 1:500-5000 will return all 
+Note the location column only supports the OR operator. When mixing the OR and AND operator the OR binds stronger, so 
+'a,b+c' means (a or b) and c. For the location column you can search using genome browser syntax eg. 1:500-5000 will return all 
 variants on chromosome 1 inbetween 500 and 5000. Note: modifier or low impact does not neccesairily mean no or low 
 impact as this is the interpretation of VEP. For more information about the impact or consequences take a look at the 
 link below. Here are some easy examples for searches to get an idea of the possibilities:
@@ -49,10 +73,13 @@ base 100 and 500 and between 3000 and 100000 on chromosome 1 and 3 respectively
 '1:100-500,3:3000-10000'. Note that the exclusion(!) and AND(+) operator will not work for the location column.
 * When searching in the consequence column for instance(or any other column except for the location column) if you where
 looking for all deletions in coding regions a search like 'coding_sequence_variant,frameshift' would return all coding 
-CNVs. For looking for CNVs that overlap a 5' UTR and an intron a search in the form of '5_prime_UTR_variant+intron_variant'
+CNVs. In the consequence column a complete term only matches that term and part of a term, like 'frameshift', matches 
+all terms it is part of. For looking for CNVs that overlap a 5' UTR and an intron a search in the form of '5_prime_UTR_variant+intron_variant'
 returns all CNVs that overlap both. If you want to not include all down and upstream variants a search like 
 '!downstream_gene_variant,upstream_gene_variant' will return all variants that are not upstream or downsteam variants.
-Note mixing of the OR (,) and AND (+) operators is not advised and the results can be inconsistent.
+The OR (,) and AND (+) operators can be mixed, the values seperated by a , are combined first. For example 
+'coding_sequence_variant,frameshift+intron_variant' returns the CNVs that overlap an intron and are coding or cause a 
+frameshift. A "!" at the start excludes the result of the whole filter.
 * Finaly to finetune your search you can filter in multiple columns at the same time making it possible to find all 
 CNVs in coding regions and on chromosome 1 for instance for that to happen you would need to type a '1' in the location
 filter and 'coding_sequence_variant,frameshift' in the consequence filter.
@@ -62,54 +89,345 @@ ontologizer_table_explanation = """
 ###### Running ontologizer:
 For running ontologizer from this webinterface there are a few things you should know. To run ontologizer it is assumed
 that the appropiate gene ontology, association and population files are present in the directory provided to this script. 
-The set of genes against which is tested is the set currently displayed in the table and charts. Ontologizer needs about 
-30 seconds to run so be patient. You can filter to see results for a certain p-value. If you want to see all results simply
-set the p-value to 1. To view a graphical map of the go terms in their graph take a look at the png that was produced in 
-the directory provided to this script.
+The set of genes against which is tested is the set currently displayed in the table and charts. The terms are tested
+with the Parent-Child-Union method and Benjamini-Hochberg correction like Ontologizer does. The first run reads the gene
+ontology which takes a few seconds, after that a run takes less than a second. Runs happen in the background so you can
+keep using the table and the label next to the button tells when the results are shown. You can filter to see results 
+for a certain p-value. If you want to see all results simply set the p-value to 1. To view a graphical map of the go 
+terms in their graph take a look at the png that annotate_cnvs.nf produced in the directory provided to this script.
 """
 
-def setup():
+class Dataset:
+    def __init__(self, result_dir, name=None):
+        """
+        Class that holds everything the app shows of one result directory. The table is read from the memory mapped
+        cache of vep_table, so processes that show the same directory share the pages of the table. Once it is made the
+        table and indexes are only read, so the callbacks of multiple users can use them at the same time.
+        :param result_dir: Directory with the results of annotate_cnvs.nf.
+        :param name: Name of the dataset in the urls of a DatasetStore, None when the app shows one result directory.
+        :param df: pandas dataframe that holds the vep tab seperated values.
+        :param unique_chromosomes: List containing all unique chromosomes in the pandas dataframe. This is pre
+        calculated to prevent repeat calculations
+        :param location_index: LocationIndex of the Location column for searching regions without parsing the locations.
+        :param consequence_index: ConsequenceIndex holding the Consequence column as bitmasks for counting and filtering.
+        :param variant_index: VariantIndex with one row per variant for counting the types and chromosomes of the cnvs.
+        :param text_index: TextIndex for filtering the text of the columns on their unique values.
+        :param query_cache: LruCache of the positions of the rows of filtered and sorted tables.
+        :param graph_cache: LruCache of the graphs of filtered tables.
+        :param go_enrichment: GoEnrichment of the gene ontology and associations, read by the first ontologizer job.
+        :param go_enrichment_key: The inputs_key of the files go_enrichment was read from.
+        :param input_stats: List of the location, size and modification time of the ontologizer files that were hashed.
+        :param inputs_key: The inputs_key of the ontologizer files when they had the input_stats.
+        :param enrichment_results: ResultStore of the tested study sets, so the same genes are only tested once with the
+        same ontologizer files.
+        :param GO_file: Location of the ontologizer table of annotate_cnvs.nf that is shown first.
+        :param memory: Amount of bytes the table uses.
+        """
+        # the file names are added to the directory without a separator
+        self.result_dir = path.join(result_dir, "")
+        self.name = name
+        if not path.exists(self.result_dir):
+            raise FileNotFoundError("Cannot locate directory: {}. Make sure the directory exists".format(result_dir))
+        dir_list = listdir(self.result_dir)
+
+        # try opening the file containing annotated cnvs
+        try:
+            vep_result_file = [self.result_dir + val for val in dir_list if val.startswith("added_vep")][0]
+        except IndexError:
+            raise FileNotFoundError("No vep file found. Make sure the file name starts with added_vep.")
+
+        self.vep_version, self.vep_date, header_end = disect_header(vep_result_file)
+        # the index labels are the row positions, the precalculated indexes below are looked up with them.
+        self.df, locations = vept.load_vep_table(vep_result_file, header_end)
+        self.memory = int(self.df.memory_usage(deep=True).sum() + locations.memory_usage(deep=True).sum())
+        self.location_index = vept.LocationIndex(locations)
+        self.unique_chromosomes = self.location_index.chromosomes
+        self.consequence_index = vept.ConsequenceIndex(self.df["Consequence"])
+        self.variant_index = vept.VariantIndex(self.df, self.location_index)
+        self.text_index = vept.TextIndex(self.df)
+
+        self.query_cache = vept.LruCache(query_cache_size)
+        self.graph_cache = vept.LruCache(query_cache_size)
+        self.go_enrichment = None
+        self.go_enrichment_key = None
+        self.go_enrichment_lock = threading.Lock()
+        self.input_stats = None
+        self.inputs_key = None
+        self.enrichment_results = ontj.ResultStore()
+
+        try:
+            self.GO_file = [self.result_dir + val for val in dir_list
+                            if val.startswith("table-all_deletion_coding_cnvs")][0]
+        except IndexError:
+            print("WARNING no ontologizer file found.")
+            self.GO_file = "NO FILE FOUND"
+
+    def find_ontologizer_files(self):
+        """
+        Function that looks for the files ontologizer needs in the result directory.
+        :return: The locations of the obo, association and population file.
+        """
+        obo_file = association_file = population_file = None
+        for val in listdir(self.result_dir):
+            if val.endswith(".obo"):
+                obo_file = self.result_dir + val
+            elif val.startswith("association"):
+                association_file = self.result_dir + val
+            elif val.startswith("population"):
+                population_file = self.result_dir + val
+        if None in [obo_file, association_file, population_file]:
+            raise FileNotFoundError("Cannot find the obo and/or population and association file. Please make sure they "
+                                    "are in {}".format(self.result_dir))
+        return obo_file, association_file, population_file
+
+    def enrichment_inputs(self):
+        """
+        Function that gives the files ontologizer needs and their inputs_key. The files are only hashed again when their
+        size or modification time changed.
+        :return: List of the locations of the obo, association and population file and the inputs_key of the files.
+        """
+        input_files = self.find_ontologizer_files()
+        input_stats = [(input_file, stat(input_file).st_size, stat(input_file).st_mtime) for input_file in input_files]
+        with self.go_enrichment_lock:
+            if input_stats != self.input_stats:
+                self.inputs_key = goe.inputs_key(*input_files)
+                self.input_stats = input_stats
+            return input_files, self.inputs_key
+
+    def load_go_enrichment(self):
+        """
+        Function that reads the gene ontology, associations and population of the result directory once, all
+        ontologizer jobs test with the same GoEnrichment until the files change. The compiled index made by
+        annotate_cnvs.nf is used when it is made from the same files, otherwise it is made here.
+        :return: Instance of GoEnrichment.
+        """
+        input_files, key = self.enrichment_inputs()
+        with self.go_enrichment_lock:
+            if self.go_enrichment is None or self.go_enrichment_key != key:
+                self.go_enrichment = goe.load_enrichment(*input_files, index_file=self.result_dir + goe.INDEX_NAME,
+                                                         key=key)
+                self.go_enrichment_key = key
+            return self.go_enrichment
+
+    def cache_stats(self):
+        """
+        :return: Dictionary with the statistics of the query, graph and ontologizer table cache.
+        """
+        return {"queries": self.query_cache.stats(), "graphs": self.graph_cache.stats(),
+                "ontologizer_tables": self.enrichment_results.tables.stats()}
+
+
+class DatasetStore:
+    def __init__(self, root_dir, max_datasets=DEFAULT_MAX_DATASETS, max_memory=None):
+        """
+        Class that serves all result directories below a root directory. The result directories are found by their
+        added_vep file and their Dataset is only loaded when it is requested for the first time. When more than
+        max_datasets datasets are loaded, or their tables use more than max_memory MB, the dataset that was used the
+        longest time ago is removed. A removed dataset is loaded again when it is requested.
+        :param root_dir: Directory with the result directories of annotate_cnvs.nf.
+        :param max_datasets: Maximum amount of datasets that stay loaded.
+        :param max_memory: Maximum amount of MB the tables of the loaded datasets use, None for no maximum.
+        :param directories: Dictionary of the names of the datasets, their location relative to the root directory, to
+        their result directory.
+        :param entries: OrderedDict of the names of the loaded datasets to their Dataset, the least recently used first.
+        :param loads: Amount of times a dataset was loaded.
+        :param evictions: Amount of times a dataset was removed to make room for another.
+        """
+        self.root_dir = root_dir
+        self.max_datasets = max_datasets
+        self.max_memory = max_memory
+        self.directories = {}
+        self.entries = OrderedDict()
+        self.loads = 0
+        self.evictions = 0
+        # dash handles requests in multiple threads
+        self.lock = threading.Lock()
+        self.load_locks = {}
+        if not path.exists(root_dir):
+            raise FileNotFoundError("Cannot locate directory: {}. Make sure the directory exists".format(root_dir))
+        self.discover()
+
+    def discover(self):
+        """
+        Function that looks for the result directories below the root directory again, so results that were added
+        while the app runs are shown as well.
+        :return: Sorted list of the names of the datasets.
+        """
+        directories = {}
+        for directory, _, file_names in walk(self.root_dir):
+            if directory != self.root_dir and any(val.startswith("added_vep") for val in file_names):
+                directories[path.relpath(directory, self.root_dir).replace(path.sep, "/")] = directory
+        with self.lock:
+            self.directories = directories
+        return sorted(directories)
+
+    def get(self, name):
+        """
+        Function that gives a dataset, from memory when it is loaded. A dataset that is requested by multiple users
+        at the same time is loaded once, while it loads the other datasets can be used.
+        :param name: Name of the dataset.
+        :return: The Dataset.
+        """
+        with self.lock:
+            if name in self.entries:
+                self.entries.move_to_end(name)
+                return self.entries[name]
+            if name not in self.directories:
+                raise KeyError("No result directory named {} in {}".format(name, self.root_dir))
+            load_lock = self.load_locks.setdefault(name, threading.Lock())
+        with load_lock:
+            with self.lock:
+                if name in self.entries:
+                    self.entries.move_to_end(name)
+                    return self.entries[name]
+            print("Loading dataset {}...".format(name))
+            loaded = Dataset(self.directories[name], name)
+            with self.lock:
+                self.entries[name] = loaded
+                self.loads += 1
+                self.evict()
+        return loaded
+
+    def evict(self):
+        """
+        Function that removes the least recently used datasets until the loaded datasets fit. The dataset that was
+        loaded last is never removed. Needs to be called with the lock.
+        """
+        while len(self.entries) > 1 and (len(self.entries) > self.max_datasets or
+                                         (self.max_memory is not None and self.memory() > self.max_memory)):
+            name, _ = self.entries.popitem(last=False)
+            self.evictions += 1
+            print("Removed dataset {} from memory...".format(name))
+
+    def memory(self):
+        """
+        :return: Amount of MB the tables of the loaded datasets use.
+        """
+        return sum(loaded.memory for loaded in self.entries.values()) / 1024 ** 2
+
+    def names(self):
+        """
+        :return: Sorted list of the names of the datasets.
+        """
+        with self.lock:
+            return sorted(self.directories)
+
+    def loaded(self):
+        """
+        :return: List of the names and Datasets of the loaded datasets.
+        """
+        with self.lock:
+            return list(self.entries.items())
+
+    def stats(self):
+        """
+        :return: Dictionary with the amount of datasets, loads and evictions and the loaded datasets.
+        """
+        with self.lock:
+            return {"datasets": len(self.directories), "loaded": list(self.entries), "loads": self.loads,
+                    "evictions": self.evictions, "memory": round(self.memory(), 1), "max_datasets": self.max_datasets,
+                    "max_memory": self.max_memory}
+
+
+def create_app(result_dir, max_jobs=ontj.DEFAULT_MAX_JOBS):
     """
-    Function to setup some basic variables and the layout of the dash app.
-    :param  df: pandas dataframe that holds the vep tab seperated values.
-    :param unique_chromosomes: List containing all unique chromosomes in the pandas dataframe. This is pre calculated to
-    prevent repeat calculations
-    :param dfo: ontologizer dataframe holding the tab seperated data produced by ontologizer.
+    Function that loads the result directory and sets up the dash app to show it. This is used by the command line
+    and by wsgi.py, where every worker of a WSGI server calls it when it imports the app.
+    :param result_dir: Directory with the results of annotate_cnvs.nf.
+    :param max_jobs: Amount of ontologizer runs that can run at the same time.
+    :return: The dash app, its Flask server is app.server.
     """
-    dir_list = listdir(result_dir)
+    global dataset, datasets, ontologizer_jobs
+    dataset = Dataset(result_dir)
+    datasets = None
+    ontologizer_jobs = ontj.OntologizerJobs(max_jobs)
+    app.layout = create_layout(dataset)
+    print("Loaded vep and ontologizer dataframes...")
+    return app
 
-    # try opening the file containing annotated cnvs
-    try:
-        vep_result_file = [result_dir + val for val in dir_list if val.startswith("added_vep")][0]
-    except IndexError:
-        raise FileNotFoundError("No vep file found. Make sure the file name starts with added_vep.")
-
-    global df
-    vep_version, vep_date, header_end = disect_header(vep_result_file)
-    df = pd.read_csv(vep_result_file, sep="\t", skiprows=[i for i in range(header_end)], header=0, index_col=False)
-    df = df.rename(index=str, columns={"#Uploaded_variation": "ID", "cDNA_position": "cDNA position", \
-                                       "CDS_position": "CDS position", "Protein_position": "Protein position", \
-                                       "Amino_acids": "Amino acids", "Existing_variation": "Existing variation",
-                                       "Feature_type": "Feature type"})
-
-    global unique_chromosomes
-    unique_chromosomes = [key for key, val in {name.split(":")[0]: "" for name in df["Location"]}.items()]
-
-    # Adding white spaces to long columns, making sure that the dash table can multi-line those columns.
-    df["Consequence"] = df["Consequence"].apply(add_whitespace)
-    df["Extra"] = df["Extra"].apply(add_whitespace)
-    df["INFO"] = df["INFO"].apply(add_whitespace)
 
-    try:
-        GO_file = [result_dir + val for val in listdir(result_dir) if val.startswith("table-all_deletion_coding_cnvs")][0]
-    except IndexError:
-        print("WARNING no ontologizer file found.")
-        GO_file = "NO FILE FOUND"
-    ##The layout of the page including the table graphs and text.
+def create_multi_app(root_dir, max_datasets=DEFAULT_MAX_DATASETS, max_memory=None, max_jobs=ontj.DEFAULT_MAX_JOBS):
+    """
+    Function that sets up the dash app to show all result directories below a root directory. Every result directory
+    is a page with its name as url, the page of the root lists them.
+    :param root_dir: Directory with the result directories of annotate_cnvs.nf.
+    :param max_datasets: Maximum amount of datasets that stay loaded.
+    :param max_memory: Maximum amount of MB the tables of the loaded datasets use, None for no maximum.
+    :param max_jobs: Amount of ontologizer runs that can run at the same time.
+    :return: The dash app, its Flask server is app.server.
+    """
+    global dataset, datasets, ontologizer_jobs
+    datasets = DatasetStore(root_dir, max_datasets, max_memory)
+    dataset = None
+    ontologizer_jobs = ontj.OntologizerJobs(max_jobs)
     app.layout = html.Div([
+        dcc.Location(id='url', refresh=False),
+        html.Div(id='page-content')
+    ])
+    print("Found {} result directories...".format(len(datasets.names())))
+    return app
+
+
+def current_dataset(name=None):
+    """
+    :param name: Name of the dataset of the page, None when the app shows one result directory.
+    :return: The Dataset the callbacks work on.
+    """
+    if name is not None:
+        return datasets.get(name)
+    return dataset
+
+
+@app.callback(
+    Output('page-content', 'children'),
+    [Input('url', 'pathname')])
+def display_page(pathname):
+    """
+    Function that shows the page of the dataset in the url, or the list of datasets for the root url.
+    :param pathname: String of the path of the url.
+    :return: html Div of the page.
+    """
+    name = unquote(pathname or "").strip("/")
+    if name:
+        try:
+            return create_layout(datasets.get(name))
+        except KeyError:
+            datasets.discover()
+            try:
+                return create_layout(datasets.get(name))
+            except KeyError:
+                pass
+    return create_index_layout(datasets.discover(), name)
+
+
+def create_index_layout(names, missing_name=""):
+    """
+    Function that creates the page that lists the datasets.
+    :param names: List of the names of the datasets.
+    :param missing_name: Name of a dataset that was requested but does not exist.
+    :return: html Div of the page.
+    """
+    children = [html.H1(children='Annotation summaries:')]
+    if missing_name:
+        children.append(html.P(children='No result directory named {} was found.'.format(missing_name)))
+    if not names:
+        children.append(html.P(children='No result directories with an added_vep file were found.'))
+    children.append(html.Ul([html.Li(dcc.Link(name, href='/{}/'.format(quote(name)))) for name in names]))
+    return html.Div(children, style={'marginLeft': 25})
+
+
+def create_layout(dataset):
+    """
+    Function that creates the layout of the page including the table graphs and text.
+    :param dataset: The Dataset that is shown.
+    :return: html Div of the page.
+    """
+    return html.Div([
         # title
-        html.H1(children='Annotation summary:'),
-        html.P(children='Created from VEP {} output on {}'.format(vep_version, vep_date)),
+        html.H1(children='Annotation summary:' if dataset.name is None else 'Annotation summary of {}:'.format(
+            dataset.name)),
+        html.P(children='Created from VEP {} output on {}'.format(dataset.vep_version, dataset.vep_date)),
+        html.Div(dcc.Link('All datasets', href='/') if dataset.name is not None else None),
         html.Div([
             html.Br(),
             # first text block
@@ -119,14 +437,17 @@ def setup():
                    target='_blank')
         ]),
         #series of Divs for person specific data saving. These things are ment to prevent conflicts between multiple users
-            # purely to dissable the ontologizer button. Does not serve any other function
-        html.Div(id='previous-ont-click-nmbr', children=0, style=dict(display='none')),
+            #For the ontologizer job started from this page and the timer that polls it while it runs
+        dcc.Store(id='ontologizer-job'),
+        dcc.Interval(id='ontologizer-poll', interval=ontologizer_poll_interval, disabled=True),
             #For saving the the previous filter value
         html.Div(id='previous-filter', children="",style=dict(display='none')),
             #for saving the ontologizer data frame
         html.Div(id='ontologizer-dataframe',children="jason data" ,style=dict(display='none')),
             #For saving the current GO file that is selected
-        html.Div(id='go-file-name', children=GO_file, style=dict(display='none')),
+        html.Div(id='go-file-name', children=dataset.GO_file, style=dict(display='none')),
+            #For saving the name of the dataset the page shows
+        html.Div(id='dataset-name', children=dataset.name, style=dict(display='none')),
         # the vep data table
         html.Div([
             html.Br(),
@@ -143,7 +464,7 @@ def setup():
                     {'if': {'column_id': 'Extra'},
                      'width': '300px'},
                 ],
-                columns=[{'name': i, 'id': i} for i in df.columns],
+                columns=[{'name': i, 'id': i} for i in dataset.df.columns],
                 fixed_rows={'headers': True, 'data': 0},
                 page_current=0,
                 page_size=100,
@@ -272,8 +593,6 @@ def setup():
     ],
         style={'marginLeft': 25}
     )
-    print("Loaded vep and ontologizer dataframes...")
-    return
 
 ############ FILE SAVING FUNTIONS #################
 @app.callback(
@@ -282,8 +601,9 @@ def setup():
     [State('table-sorting-filtering-graph', 'sort_by'),
      State('table-sorting-filtering-graph', 'filter_query'),
      State('vep-csv-input-name', 'value'),
-     State('radio-choose-download', 'value')])
-def write_from_vep_table(nc, sort_by, filter, input_name, down_choice):
+     State('radio-choose-download', 'value'),
+     State('dataset-name', 'children')])
+def write_from_vep_table(nc, sort_by, filter, input_name, down_choice, dataset_name):
     """
     Funtion that tells the a writer function to either make a gene identifier file containing all genes present in
     the table or make a csv file consisting of the data currently displayed in the vep table.
@@ -292,14 +612,17 @@ def write_from_vep_table(nc, sort_by, filter, input_name, down_choice):
     :param filter: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
     :param input_name: The name specified by the user.
     :param down_choice: String representing the value of the radio button currently active
+    :param dataset_name: Name of the dataset of the page.
     :return: String that tells the user what happened during the saving of the file. Nc is none at startup so we want to
     prevent that a file gets saved.
     """
     if nc is not None:
+        dataset = current_dataset(dataset_name)
         if down_choice == "full":
-            return write_csv_file(input_name, filter_sort(sort_by, filter))
+            return write_csv_file(dataset, input_name,
+                                  display_rows(dataset, query_rows(dataset, sort_by, filter), whitespace=False))
         elif down_choice == "ids":
-            return get_gene_identifiers(sort_by, filter, input_name)
+            return get_gene_identifiers(dataset, sort_by, filter, input_name)
     else:
         return ''
 
@@ -311,38 +634,42 @@ def write_from_vep_table(nc, sort_by, filter, input_name, down_choice):
      State('table-sorting-filtering-graph', 'filter_query'),
      State('ontologizer-csv-input-name', 'value'),
      State('go-file-name', 'children'),
-     State('ontologizer-p-value', 'value')])
-def write_ontologizer_table(nc, sort_by, filter, input_name, GO_file, p_value):
+     State('ontologizer-p-value', 'value'),
+     State('dataset-name', 'children')])
+def write_ontologizer_table(nc, sort_by, filter, input_name, GO_file, p_value, dataset_name):
     """
     Function that writes the current ontologizer table to a csv file.
     :param nc: Number of clicks of the run-ontologizer-button
     :param sort_by: String in the form of: {column name} contains value && etc.
     :param filter: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
     :param input_name: The name specified by the user.
+    :param dataset_name: Name of the dataset of the page.
     :return: String that tells the user what happened during the saving of the file. Nc is none at startup so we want to
     prevent that a file gets saved.
     """
     if nc is not None:
+        dataset = current_dataset(dataset_name)
         try:
-            dfo = pd.read_csv(GO_file, sep="\t", header=0)
+            dfo = dataset.enrichment_results.read_table(GO_file)
         except FileNotFoundError:
             return "No ontologizer file found."
         if check_valid_p_value(p_value):
-            return write_csv_file(input_name, dfo[dfo["p.adjusted"] <= float(p_value)])
+            return write_csv_file(dataset, input_name, dfo[dfo["p.adjusted"] <= float(p_value)])
         return "Can not create a table with {} as p-value".format(p_value)
     else:
         return ''
 
 
-def write_csv_file(input_name, dataframe):
+def write_csv_file(dataset, input_name, dataframe):
     """
     Function that writes a pandas dataframe to a csv file.
+    :param dataset: The Dataset the file is written into the result directory of.
     :param input_name:
     :param dataframe: pandas Dataframe that has to be written to a csv file.
     :return: String that tells the user what happens
     """
     if input_name:
-        file_loc = "{}\\{}.csv".format(result_dir, input_name)
+        file_loc = "{}\\{}.csv".format(dataset.result_dir, input_name)
         if not path.exists(file_loc):
             try:
                 dataframe.to_csv(path_or_buf=file_loc)
@@ -354,19 +681,19 @@ def write_csv_file(input_name, dataframe):
     else:
         return "Please enter a name"
 
-def get_gene_identifiers(sort_by, filter, input_name):
+def get_gene_identifiers(dataset, sort_by, filter, input_name):
     """
     Function for saving a list of gene identifiers that is currently being displayed in the table.
+    :param dataset: The Dataset of the table.
     :param sort_by: String in the form of: {column name} contains value && etc.
     :param filter: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
     :param input_name: The name specified by the user.
     :return: A string telling what happened to the file if it was saved or something else.
     """
-    dataframe = filter_sort(sort_by, filter)
     # getting all unique gene identifiers
-    all_gene_names = list(set([val for val in dataframe["Gene"]]))
+    all_gene_names = list(set(dataset.df["Gene"].values[query_rows(dataset, sort_by, filter)]))
     if input_name:
-        file_loc = "{}ident_{}.txt".format(result_dir, input_name)
+        file_loc = "{}ident_{}.txt".format(dataset.result_dir, input_name)
         if not path.exists(file_loc):
             try:
                 with open(file_loc, "w") as f:
@@ -397,8 +724,10 @@ def get_gene_identifiers(sort_by, filter, input_name):
     [State('type-graph-container', "children"),
      State('consequence-graph-container', "children"),
      State('chromosome-graph-container', "children"),
-     State('previous-filter', 'children')])
-def update_tables_graphs(page_current, page_size, sort_by, filter, type_graph, consequence_graph, chromosome_graph, prev_filter):
+     State('previous-filter', 'children'),
+     State('dataset-name', 'children')])
+def update_tables_graphs(page_current, page_size, sort_by, filter, type_graph, consequence_graph, chromosome_graph, prev_filter,
+                         dataset_name):
     """
     Function that gets called when the user requests the vep table to be sorted or filtered.
     :param page_current: The current page the user is on
@@ -408,39 +737,107 @@ def update_tables_graphs(page_current, page_size, sort_by, filter, type_graph, c
     :param type_graph: A copy of the type_graph
     :param consequence_graph: A copy of the consequence graph
     :param chromosome_graph: A copy of the chromosome graph
+    :param dataset_name: Name of the dataset of the page.
     :return: A list containing the vep data table and the three graphs
     """
     return_list = []
-    dff = filter_sort(sort_by, filter)
+    dataset = current_dataset(dataset_name)
+    rows = query_rows(dataset, sort_by, filter)
     page = page_current
     size = page_size
-    return_list.append(dff.iloc[page * size: (page + 1) * size].to_dict('records'))
+    return_list.append(display_rows(dataset, rows[page * size: (page + 1) * size]).to_dict('records'))
     # if there is no filter and all graphs are not None return the graphs as is and dont recalculate them
     if filter == prev_filter and all(x is not None for x in [type_graph, consequence_graph, chromosome_graph]):
         print("Table sorted...")
         return_list += [type_graph, consequence_graph, chromosome_graph]
     else:
         print("Table sorted en filtered...")
-        # If a filter was applied to the data recalculate all graphs
-        return_list.append(update_graph_types(dff))
-        print("Types graph generated...")
-        return_list.append(update_graph_consequences(dff))
-        print("Consequences graph generated...")
-        return_list.append(update_graph_chromosome_location(dff))
-        print("Chromosome graph generated...")
+        # If a filter was applied to the data recalculate all graphs, unless they are still in the cache
+        return_list += query_graphs(dataset, filter, rows)
         prev_filter = filter
     print("Data calculation finished!\n")
     return_list.append(prev_filter)
     return return_list
 
-def update_graph_types(dff):
+
+def query_rows(dataset, sort_by, filter):
+    """
+    Function that gives the rows of the table after filtering and sorting. The result is looked up in the query cache
+    first so paging through a table or going back to a previous filter does not filter and sort again.
+    :param dataset: The Dataset of the table.
+    :param sort_by: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
+    :param filter: String in the form of: {column name} contains value && etc.
+    :return: Array of the positions of the rows of df in the order they are displayed.
+    """
+    key = (normalize_filter(filter), normalize_sort_by(sort_by))
+    rows = dataset.query_cache.get(key)
+    if rows is None:
+        rows = filter_sort(dataset, sort_by, filter)
+        dataset.query_cache.put(key, rows)
+    return rows
+
+
+def query_graphs(dataset, filter, rows):
+    """
+    Function that gives the three graphs of a filtered table. The graphs do not depend on the sorting so they are
+    cached on the filter alone.
+    :param dataset: The Dataset of the table.
+    :param filter: String in the form of: {column name} contains value && etc.
+    :param rows: Array of the positions of the rows of df that are left after filtering.
+    :return: List containing the type, consequence and chromosome graph.
+    """
+    key = normalize_filter(filter)
+    graphs = dataset.graph_cache.get(key)
+    if graphs is None:
+        graphs = [update_graph_types(dataset, rows)]
+        print("Types graph generated...")
+        graphs.append(update_graph_consequences(dataset, rows))
+        print("Consequences graph generated...")
+        graphs.append(update_graph_chromosome_location(dataset, rows))
+        print("Chromosome graph generated...")
+        dataset.graph_cache.put(key, graphs)
+    return graphs
+
+
+def normalize_filter(filter):
+    """
+    Function that turns a filter into a key for the caches. The filters of the different columns are all applied so
+    their order does not matter.
+    :param filter: String in the form of: {column name} contains value && etc.
+    :return: Tuple of the filter parts in sorted order.
+    """
+    return tuple(sorted(part.strip() for part in filter.split(' && ') if part.strip()))
+
+
+def normalize_sort_by(sort_by):
+    """
+    :param sort_by: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
+    :return: Tuple of column and direction pairs that can be used as key for the query cache.
+    """
+    return tuple((col["column_id"], col["direction"]) for col in sort_by)
+
+
+@app.server.route("/cache-stats")
+def cache_stats():
+    """
+    Page that shows the amount of hits and misses of the caches, for tuning the size of the caches.
+    :return: JSON response with the statistics of the query, graph and ontologizer table cache. When the app serves a
+    root directory the statistics of the loaded datasets and of the datasets themselves.
+    """
+    if datasets is not None:
+        return jsonify(datasets=datasets.stats(),
+                       caches={name: loaded.cache_stats() for name, loaded in datasets.loaded()})
+    return jsonify(**dataset.cache_stats())
+
+def update_graph_types(dataset, rows):
     """
     Function for creating a graph of the types of cnvs and accompanying table
-    :param dff: Pandas Dataframe sorted and filtered as requested by the user
+    :param dataset: The Dataset of the table.
+    :param rows: Array of the positions of the rows of df that are left after filtering as requested by the user
     :return: graph and table that contains the amounts and percentages of the different types of cnvs.
     """
-    column_names = ["insertion", "deletion", "dispersed duplication", "tandem duplication"]
-    type_numbers = count_types(dff)
+    column_names = vept.TYPE_NAMES
+    type_numbers = count_types(dataset, rows)
     try:
         type_percent = [round(x / sum(type_numbers) * 100, 2) for x in type_numbers]
         data = get_ordered_dict(["type", "amount", "percent"], list(zip(type_numbers, type_percent)), column_names)
@@ -484,13 +881,14 @@ def update_graph_types(dff):
         )
     ]
 
-def update_graph_consequences(dff):
+def update_graph_consequences(dataset, rows):
     """
     Function for creating a graph of the consequences of cnvs and accompanying table
-    :param dff: Pandas Dataframe sorted and filtered as requested by the user
+    :param dataset: The Dataset of the table.
+    :param rows: Array of the positions of the rows of df that are left after filtering as requested by the user
     :return: graph and table that contains the amounts and percentages of the different consequences of the cnvs.
     """
-    con_names, con_vals = count_consequences(dff)
+    con_names, con_vals = count_consequences(dataset, rows)
     # incase there is no data in the table
     if not len(con_vals):
         return [html.Br(),
@@ -537,13 +935,14 @@ def update_graph_consequences(dff):
     ]
 
 
-def update_graph_chromosome_location(dff):
+def update_graph_chromosome_location(dataset, rows):
     """
     Function for creating a graph of the distribution of cnvs over the chromosomes and accompanying table.
-    :param dff: Pandas Dataframe sorted and filtered as requested by the user
+    :param dataset: The Dataset of the table.
+    :param rows: Array of the positions of the rows of df that are left after filtering as requested by the user
     :return: graph and table that contains the amounts and percentages of the distribution of the cnvs over the chromosomes
     """
-    chromosomes, chrom_vals = count_chromosomes(dff)
+    chromosomes, chrom_vals = count_chromosomes(dataset, rows)
     # incase there is no data in the table
     if not len(chrom_vals):
         return [html.Br(),
@@ -591,100 +990,129 @@ def update_graph_chromosome_location(dff):
     ]
 
 @app.callback(
-    [Output('ontologizer-table-container', 'children'),
-     Output('ontologizer-run-output-label', 'children'),
-     Output('previous-ont-click-nmbr', 'children'),
-     Output('go-file-name', 'children')],
-    [Input('run-ontologizer-button', 'n_clicks'),
-     Input('ontologizer-p-value', 'value'),
-     Input('table-sorting-filtering-graph', "page_current"),
-     Input('table-sorting-filtering-graph', "page_size")],
+    Output('ontologizer-job', 'data'),
+    [Input('run-ontologizer-button', 'n_clicks')],
     [State('table-sorting-filtering-graph', 'sort_by'),
      State('table-sorting-filtering-graph', 'filter_query'),
      State('ontologizer-run-input-name', 'value'),
-     State('go-file-name', 'children'),
-     State('previous-ont-click-nmbr', 'children')])
-def update_ontologizer(nc, p_value, page, page_size, sort_by, filter, input_name, GO_file, prev_nc):
+     State('ontologizer-p-value', 'value'),
+     State('dataset-name', 'children')])
+def start_ontologizer(nc, sort_by, filter, input_name, p_value, dataset_name):
     """
-    Function that updates the ontologizer table based when requested a new ontologizer run or when a different p-value
-    is requested
+    Function that writes the gene identifiers currently in the table to a study set and starts an ontologizer job for
+    it in the background. The job tests the study set with go_enrichment.py in this process instead of running
+    get_go_terms.nf, so the ontology is only read once.
     :param nc: Number of clicks of the run-ontologizer-button
+    :param sort_by: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
+    :param filter: String in the form of: {column name} contains value && etc.
+    :param input_name: The name specified by the user.
+    :param p_value: float between 0 and 1 that represents what p-values the user wants to see displayed.
+    :param dataset_name: Name of the dataset of the page.
+    :return: Dictionary with the id of the started job, or None when no job was started, a message for the user, the
+    study set and the result table when the job is already done because the same genes were tested before.
+    """
+    if nc is None:
+        return {"job_id": None, "message": ""}
+    if not check_valid_p_value(p_value):
+        return {"job_id": None, "message": "{} is not a valid p-value.".format(p_value)}
+    # write a file of all the gene identifiers that are currently in the table.
+    dataset = current_dataset(dataset_name)
+    message = get_gene_identifiers(dataset, sort_by, filter, input_name)
+    if "file created at" not in message:
+        return {"job_id": None, "message": message}
+    study_set = "{}ident_{}.txt".format(dataset.result_dir, input_name)
+    try:
+        input_files, inputs_key = dataset.enrichment_inputs()
+    except FileNotFoundError as error:
+        #remove the file that was created to prevent the program from telling the file name already exists
+        remove(study_set)
+        return {"job_id": None, "message": str(error)}
+    # results of other versions of the ontologizer files are not reused
+    dataset.enrichment_results.set_inputs(dataset.result_dir, inputs_key, input_files)
+    job = ontologizer_jobs.submit(study_set, dataset.result_dir, dataset.load_go_enrichment,
+                                  dataset.enrichment_results)
+    # the poll can be answered by another worker process that does not know the job, it finds the result by its files
+    return {"job_id": job.job_id, "message": job.message, "study_set": study_set, "GO_file": job.GO_file}
+
+
+@app.callback(
+    [Output('ontologizer-run-output-label', 'children'),
+     Output('ontologizer-poll', 'disabled'),
+     Output('go-file-name', 'children')],
+    [Input('ontologizer-job', 'data'),
+     Input('ontologizer-poll', 'n_intervals')],
+    [State('go-file-name', 'children')])
+def poll_ontologizer(job_data, n_intervals, GO_file):
+    """
+    Function that reports the state of the ontologizer job of this page. The poll timer is on while the job is queued
+    or running, when the job is done its result table becomes the shown GO file.
+    :param job_data: Dictionary with the id of the job and a message, as returned by start_ontologizer.
+    :param n_intervals: Number of times the poll timer fired.
+    :param GO_file: String representing the location of the GO_file that is displayed.
+    :return: A message for the user, a Boolean telling if the poll timer is off and the GO file to display.
+    """
+    if not job_data or job_data["job_id"] is None:
+        return (job_data or {}).get("message", ""), True, GO_file
+    job = ontologizer_jobs.get(job_data["job_id"])
+    if job is None:
+        return poll_ontologizer_files(job_data, GO_file)
+    if job.status == ontj.DONE:
+        # the result is in the ResultStore of the dataset, the job itself is not needed anymore
+        ontologizer_jobs.remove(job.job_id)
+        return job.message or "Ontologizer results written to {}".format(job.GO_file), True, job.GO_file
+    if job.status == ontj.FAILED:
+        ontologizer_jobs.remove(job.job_id)
+        return job.message, True, GO_file
+    return "Ontologizer is {}...".format(job.status), False, GO_file
+
+
+def poll_ontologizer_files(job_data, GO_file):
+    """
+    Function that reports the state of an ontologizer job that is not known in this process. Jobs are kept in the
+    memory of the process that started them, with multiple workers another worker looks at the files of the job instead.
+    The result table is moved in place when it is complete and the study set is removed when the job failed.
+    :param job_data: Dictionary with the id of the job, a message, the study set and the earlier result table.
+    :param GO_file: String representing the location of the GO_file that is displayed.
+    :return: A message for the user, a Boolean telling if the poll timer is off and the GO file to display.
+    """
+    if job_data.get("GO_file") is not None:
+        return job_data["message"], True, job_data["GO_file"]
+    study_set = job_data.get("study_set")
+    if study_set is None or not path.exists(study_set):
+        # the job failed or the server was restarted before the job was done
+        return "The ontologizer job could not be found.", True, GO_file
+    result_file = path.join(path.dirname(study_set), goe.table_name(study_set))
+    if path.exists(result_file):
+        return "Ontologizer results written to {}".format(result_file), True, result_file
+    return "Ontologizer is {}...".format(ontj.RUNNING), False, GO_file
+
+
+@app.callback(
+    Output('ontologizer-table-container', 'children'),
+    [Input('ontologizer-p-value', 'value'),
+     Input('table-sorting-filtering-graph', "page_current"),
+     Input('table-sorting-filtering-graph', "page_size"),
+     Input('go-file-name', 'children')],
+    [State('dataset-name', 'children')])
+def update_ontologizer(p_value, page, page_size, GO_file, dataset_name):
+    """
+    Function that updates the ontologizer table when an ontologizer job is done or when a different p-value is
+    requested
     :param p_value: float between 0 and 1 that represents what p-values the user wants to see displayed.
     :param page: The current page the user is on
     :param page_size: Number representing the amount of hits per page
-    :param sort_by: String in the form of: {column name} contains value && etc.
-    :param filter: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
-    :param input_name: The name specified by the user.
     :param GO_file: String representing the location of the GO_file that has to be displayed in the
-    :param prev_nc: Number of clicks before this function was called. This is to check if someone wants to run
-    ontologizer or not.
+    :param dataset_name: Name of the dataset of the page.
     :return: A list containing html and dash components that are either a label or a datatable depending on the
-    ontologizer file and run together with a message telling the user what happened and 2 values for saving certain data
+    ontologizer file.
     """
     try:
-        dfo = pd.read_csv(GO_file, sep="\t", header=0)
+        # the table is only read from disk when it was not used recently
+        dfo = current_dataset(dataset_name).enrichment_results.read_table(GO_file)
     except FileNotFoundError:
         # If no file is present give empty data frame
         dfo = pd.DataFrame()
-    if nc == None or prev_nc == None or nc > prev_nc:
-        return run_ontologizer(nc, sort_by, filter, input_name, GO_file, p_value, dfo, page, page_size)
-    else:
-        return create_ontologizer_data_table(dfo, p_value, page, page_size) + ["", nc, GO_file]
-
-def run_ontologizer(nc, sort_by, filter, input_name, GO_file, p_value, dfo, page, page_size):
-    """
-    Fubction that runs ontologizer by deploying a command on the command line.
-    :param nc: Number of clicks of the run-ontologizer-button
-    :param p_value: float between 0 and 1 that represents what p-values the user wants to see displayed.
-    :param sort_by: String in the form of: {column name} contains value && etc.
-    :param filter: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
-    :param input_name: The name specified by the user.
-    :param GO_file: String representing the location of the GO_file that has to be displayed in the
-    :param dfo: pandas dataframe of ontologizer data.
-    :param page: The current page the user is on
-    :param page_size: Number representing the amount of hits per page
-    :return: A list containing html and dash components that are either a label or a datatable depending on the
-    ontologizer file and run
-    """
-    message = ""
-    if nc is not None and check_valid_p_value(p_value):
-        # write a file of all the gene identifiers that are currently in the table.
-        message = get_gene_identifiers(sort_by, filter, input_name)
-        if "file created at" in message:
-            # filterign out the correct files for the analasys
-            dir_list = listdir(result_dir)
-            for val in dir_list:
-                if val.endswith(".obo"):
-                    obo_file = result_dir + val
-                elif val.startswith("association"):
-                    association_file = result_dir + val
-                elif val.startswith("population"):
-                    population_file = result_dir + val
-                elif val.startswith("ident_" + input_name):
-                    study_set = result_dir + val
-            try:
-                # String representing the command to be executed
-                command_str = "get_go_terms.nf --obo {} --association {} --population {} --study {} --output_dir {}" \
-                    .format(obo_file, association_file, population_file, study_set, result_dir)
-                system(command_str)
-
-                # looking for the created file. If the file did not get created due to the nextflow pipeline crashing and
-                # index error is raised.
-                GO_file = [result_dir + val for val in listdir(result_dir) if val.startswith("table-ident_{}"\
-                                                                                             .format(input_name))][0]
-                message = "\\".join(GO_file.split("\\")[:-1]) + GO_file
-                dfo = pd.read_csv(GO_file, sep="\t", header=0)
-            except UnboundLocalError:
-                #remove the file that was created to prevent the program from telling the file name already exists
-                remove("{}ident_{}.txt".format(result_dir, input_name))
-                message = "Cannot find the obo and/or population and association file. Please make sure they are in {}"\
-                    .format(result_dir)
-            except IndexError:
-                #remove the file that was created to prevent the program from telling the file name already exists
-                remove("{}ident_{}.txt".format(result_dir, input_name))
-                message = "Something went wrong while running ontologizer. The output file could not be found at {}."\
-                    .format(result_dir)
-    return create_ontologizer_data_table(dfo, p_value, page, page_size) + [message, nc, GO_file]
+    return create_ontologizer_data_table(dfo, p_value, page, page_size)[0]
 
 def create_ontologizer_data_table(dfo, p_value, page, page_size):
     """
@@ -733,73 +1161,52 @@ def create_ontologizer_data_table(dfo, p_value, page, page_size):
                  style={'marginTop': 20}
              )]]
 
-@app.callback(Output('run-ontologizer-button', 'disabled'),
-              [Input('run-ontologizer-button', 'n_clicks'),
-               Input('previous-ont-click-nmbr', 'children')])
-def change_button_state(nc, trigger):
-    """
-    Function that dissables the run-ontologizer button while ontologizer is running
-    :param nc: number of from the run-ontologizer button
-    :param trigger: A dummy Div component that is updated to signify when ontologizer is done running
-    :return: Boolean that tells the button to be dissables (True) or enabled (False).
-    """
-    context = dash.callback_context.triggered[0]['prop_id'].split('.')[0]
-    if context == "run-ontologizer-button":
-        if nc is not None:
-            return True
-        else:
-            return False
-    else:
-        return False
-
 ################## FILTER SORTING FUNCTIONS ##################
 
-def filter_sort(sort_by, filter):
+def filter_sort(dataset, sort_by, filter):
     """
-    Function that gets called to sort and/ or filter the vep data table.
-    :param sort_by: String in the form of: {column name} contains value && etc.
-    :param filter: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
-    :return: pandas Dataframe that is a modified version of df as defined in the setup.
+    Function that gets called to sort and/ or filter the vep data table. The table itself is never copied or changed,
+    the filters and sorting work on the positions of the rows so multiple users can use the same table at once.
+    :param dataset: The Dataset of the table.
+    :param sort_by: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
+    :param filter: String in the form of: {column name} contains value && etc.
+    :return: Array of the positions of the rows of df in the order they are displayed.
     """
-    dff = df
+    rows = np.arange(len(dataset.df))
     if len(filter):
-        dff = filter_table(filter, dff)
+        rows = filter_table(dataset, filter, rows)
     if len(sort_by):
-        dff = sort_table(sort_by, dff)
-    return dff
+        rows = sort_table(dataset, sort_by, rows)
+    return rows
 
-def filter_table(filter, dff):
+def filter_table(dataset, filter, rows):
     """
     Function that does filters based on filters specified oabove the columns. There are 3 operators that allow for a
     more refined search. An AND, OR and exclusion operator. The AND operator is defined by a + the OR by a , and the
     exclusion by a ! at the start of the filter expression. The exclusion is basic and simply means that the filter is
-    reversed.
-    :param filter: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
-    :param dff: pandas Dataframe that is a modified version of df as defined in the setup.
-    :return: pandas Dataframe that is modified by the filters that are applied.
+    reversed. Every filter is a boolean mask over all rows, text filters are compiled once and done on the unique
+    values of a column.
+    :param dataset: The Dataset of the table.
+    :param filter: String in the form of: {column name} contains value && etc.
+    :param rows: Array of the positions of the rows of df that are filtered.
+    :return: Array of the positions of the rows that are left after the filters are applied.
     """
+    mask = np.zeros(len(dataset.df), dtype=bool)
+    mask[rows] = True
     filtering_expressions = filter.split(' && ')
     for filter_part in filtering_expressions:
         col_name, filter_value = split_filter_part(filter_part)
         #seperate filter for location to allow searching using a genome browser syntax.
         if col_name == "Location":
-            valid_rows = []
-            for loc in filter_value.split(","):
-                valid_rows += filter_locations(dff, loc)
-            dff = dff.loc[valid_rows]
+            mask &= filter_locations(dataset, filter_value)
         elif col_name is not None:
-            # create regex pattern with options seperated by comma treated as or and with a plus as and. This system is not
-            # perfect and mixign the two can result in unexpected results.
-            # add an exclusion character ! if infront of the filter expression the filter is reversed.
-            if filter_value.startswith("!"):
-                match = False
-                filter_value = filter_value[1:]
-            else:
-                match = True
-            filter_values = "|".join(filter_value.split(","))
-            filter_values = "".join(["(?=.*{})".format(x) for x in filter_values.split("+")])
-            dff = dff.loc[dff[col_name].str.contains(filter_values) == match]
-    return dff
+            if col_name == "Consequence":
+                mask &= filter_consequences(dataset, filter_value)
+                continue
+            # options seperated by comma are treated as or and with a plus as and, the comma binds stronger so a,b+c
+            # means (a or b) and c. An exclusion character ! infront of the filter expression reverses the filter.
+            mask &= dataset.text_index.select(col_name, filter_value)
+    return np.flatnonzero(mask)
 
 def split_filter_part(filter_part):
     """
@@ -819,175 +1226,89 @@ def split_filter_part(filter_part):
         return name, value
     return [None] * 2
 
-def filter_locations(dff, filter_value):
+def filter_locations(dataset, filter_value):
     """
-    Function that filters the Location column based on a genome browser syntax
-    :param dff: pandas Dataframe that is a modified version of df as defined in the setup.
-    :param filter_value: String in genome browser syntax.
-    :return: a list of valid rows that pandas can filter on.
+    Function that filters the Location column based on a genome browser syntax. The regions are looked up in the
+    location index of the dataset, so the locations are not parsed again for every filter.
+    :param dataset: The Dataset of the table.
+    :param filter_value: String in genome browser syntax, multiple regions can be seperated by a comma.
+    :return: Boolean array telling for every row of df if it is in one of the regions.
     """
-    valid_rows = []
-    try:
-        #value error in case of multiple :
-        if ":" in filter_value:
-            chrom, startend = str(filter_value).split(":")
-            # value error in case of multiple -
-            start, end = startend.split("-")
-        elif filter_value in unique_chromosomes:
-            dff = dff.loc[dff["Location"].str.contains("^{}".format(filter_value))]
-            for key, col in dff["Location"].items():
-                valid_rows.append(key)
-            return valid_rows
-        else:
-            return valid_rows
-        #check if row starts with chromosome.
-        dff = dff.loc[dff["Location"].str.contains("^{}".format(chrom))]
-        for key, col in dff["Location"].items():
-            if "-" in col:
-                # value error in case of multiple -
-                startc, endc = col.split("-")
-                startc = startc.split(":")[1]
-            else:
-                startc = col.split(":")[1]
-                endc = startc
-            #value error when no integers are supplied.
-            if int(startc) >= int(start) and int(endc) <= int(end):
-                valid_rows.append(key)
-    except ValueError:
-        #there are a couple of places this can happen in this case just return an empty match
-        return valid_rows
-    return valid_rows
+    return dataset.location_index.select(filter_value)
 
 
-def sort_table(sort_by, dff):
+def filter_consequences(dataset, filter_value):
     """
-    Function for sorting 1 column by the values of its rows.
-    :param sort_by: String in the form of: {column name} contains value && etc.
-    :param dff: pandas Dataframe that is a modified version of df as defined in the setup.
-    :return: pandas Dataframe that is sorted depending on the column.
+    Function that filters the Consequence column on its terms with the consequence index of the dataset. A value that is
+    a consequence term only matches that term, not the longer terms it is part of.
+    :param dataset: The Dataset of the table.
+    :param filter_value: String containing the filter expression.
+    :return: Boolean array telling for every row of df if it matches the filter.
+    """
+    return dataset.consequence_index.select(filter_value)
+
+
+def sort_table(dataset, sort_by, rows):
+    """
+    Function for sorting 1 column by the values of its rows. Only the values of the column for the given rows are
+    sorted, the table itself is not changed. Location and ID are sorted on the ranks of the indexes of the dataset.
+    :param dataset: The Dataset of the table.
+    :param sort_by: List of Dictionaries in form of: {column_id : column_name, direction : asc of desc}
+    :param rows: Array of the positions of the rows of df that are sorted.
+    :return: Array of the positions of the rows in sorted order.
     """
     for col in sort_by:
         col_name = col["column_id"]
-        #Custom sorting on location this has to be done seperatly making sure the data is sorted on chromosome then start
-        # and then stop making sure the sorting makes sense
+        ascending = col["direction"] == "asc"
+        #Custom sorting on location making sure the data is sorted on chromosome then start and then stop.
         if col_name == "Location":
-            col_values = list(set([val for val in dff[col_name]]))
-            if col["direction"] == "asc":
-                col_values.sort(key=lambda x: sort_by_chromosome(x))
-                sort_categories = col_values
-            else:
-                col_values.sort(key=lambda x: sort_by_chromosome(x))
-                sort_categories = col_values[::-1]
-            dff["Location"] = pd.Categorical(dff["Location"], sort_categories)
-            dff = dff.sort_values(["Location"])
-        # Special sort on for locations because of dispersed insertions that have a .i appendage.
+            ranks = dataset.location_index.ranks[rows]
+        # Special sort for IDs because of dispersed insertions that have a .i appendage.
         elif col_name == "ID":
-            col_values = list(set([val for val in dff[col_name]]))
-            if col["direction"] == "asc":
-                col_values.sort(key=lambda x: sort_by_IDs(x))
-                sort_categories = col_values
-            else:
-                col_values.sort(key=lambda x: sort_by_IDs(x))
-                sort_categories = col_values[::-1]
-            dff["ID"] = pd.Categorical(dff["ID"], sort_categories)
-            dff.sort_values(["ID"])
+            ranks = dataset.variant_index.id_ranks[rows]
         # if not location or ID sort like it normaly would lexicographically
         else:
-            dff = dff.sort_values(col['column_id'], ascending=[col['direction'] == 'asc'], inplace=False)
-    return dff
-
-
-def sort_by_chromosome(choromosome_loc):
-    """
-    Function that defines a tuple for sorting chromosome locations
-    :param choromosome_loc: String containing the location of the cnv in the chromosme in a genome browser syntax (1:5-10)
-    :return: Tuple containing in this order a boolean determining if the chromosme is purely a number. The value of the
-    chrom itself that is an integer or string depending on the previous value. Integer respresenting the start of the
-    cnv and a integer representing the end.
-    """
-    chrom = choromosome_loc.split(":")[0]
-    if "-" in choromosome_loc:
-        start, end = choromosome_loc.split(":")[1].split("-")
-    # in case of insertions
-    else:
-        start = choromosome_loc.split(":")[1]
-        end = start
-    # see if the chromosome can be made into an integer If this is the
-    # case False is put at the start to make the numbered chromosomes come first
-    try:
-        return (False, int(chrom), int(start), int(end))
-    except ValueError:
-        return (True, chrom, int(start), int(end))
-
-
-def sort_by_IDs(ID):
-    """
-    Function that defines a tuple for sorting IDs.
-    :param ID: String representing the ID of the given cnv
-    :return: Tuple containing the numerical part of the id and a boolean representing if a dot i was in the ID.
-    """
-    ID_parts = ID.split(".")
-    if len(ID_parts) == 2:
-        return (ID_parts[0], True)
-    return (ID_parts[0], False)
+            values = dataset.df[col_name].iloc[rows].reset_index(drop=True)
+            rows = rows[values.sort_values(ascending=ascending, kind="mergesort").index.values]
+            continue
+        rows = rows[np.argsort(ranks if ascending else -ranks, kind="stable")]
+    return rows
 
 ############ LOGIC FUNCTIONS BEHIND THE GRAPHS ###################
 
-def count_types(dff):
+def count_types(dataset, rows):
     """
     Function that counts the different types of cnvs
-    :param dff: pandas Dataframe that is a modified version of df as defined in the setup.
+    :param dataset: The Dataset of the table.
+    :param rows: Array of the positions of the rows of df that are counted.
     :return: a list containing the counts of the different types of cnvs.
     """
-    # only get unique IDs prevent counting cnvs that overlap multiple transcripts.
-    dff = dff.drop_duplicates('ID')
-    dff = dff[~dff["INFO"].str.contains("INS:DISPERSED")]
-    return [len(dff[dff["Allele"] == "insertion"]),
-            len(dff[dff["Allele"] == "deletion"]),
-            len(dff[dff["INFO"].str.contains("DUP:DISPERSED")]),
-            len(dff[dff["INFO"].str.contains("DUP:TANDEM")])]
+    # counted per variant to prevent counting cnvs that overlap multiple transcripts.
+    return [int(amnt) for amnt in dataset.variant_index.count_types(rows)]
 
 
-def count_consequences(dff):
+def count_consequences(dataset, rows):
     """
-    Function that counts the occurance of each consequence potentialy annotated by vep.
-    :param dff: pandas Dataframe that is a modified version of df as defined in the setup.
-    :param con_list: List containing all possible consequences that vep can annotate. Note that some of these are most
-    likely never annotated.
+    Function that counts the occurance of each consequence potentialy annotated by vep. The counting is done on the
+    bitmasks of the consequence index so a term is only counted for rows that have exactly that term.
+    :param dataset: The Dataset of the table.
+    :param rows: Array of the positions of the rows of df that are counted.
     :return: a list of lists containing all names and all amounts of consequences that have an amount above 0.
     """
-    con_list = ['transcript_ablation', 'splice_acceptor_variant', 'splice_donor_variant', 'stop_gained',
-                'frameshift_variant',
-                'stop_lost', 'start_lost', 'transcript_amplification', 'inframe_insertion', 'inframe_deletion',
-                'missense_variant',
-                'protein_altering_variant', 'splice_region_variant', 'incomplete_terminal_codon_variant',
-                'start_retained_variant', 'stop_retained_variant', 'synonymous_variant', 'coding_sequence_variant',
-                'mature_miRNA_variant', '5_prime_UTR_variant', '3_prime_UTR_variant',
-                'non_coding_transcript_exon_variant',
-                'intron_variant', 'NMD_transcript_variant', 'non_coding_transcript_variant', 'upstream_gene_variant',
-                'downstream_gene_variant', 'TFBS_ablation', 'TFBS_amplification', 'TF_binding_site_variant',
-                'regulatory_region_ablation', 'regulatory_region_amplification', 'feature_elongation',
-                'regulatory_region_variant',
-                'feature_truncation', 'intergenic_variant']
-    val_dict = {}
-    for con in con_list:
-        val_dict[con] = len(dff[dff["Consequence"].str.contains(con)])
-    return [name for name, amnt in val_dict.items() if amnt != 0],\
-           [amnt for name, amnt in val_dict.items() if amnt != 0]
-
-def count_chromosomes(dff):
+    counts = dataset.consequence_index.count(rows)
+    return [name for name, amnt in zip(dataset.consequence_index.terms, counts) if amnt != 0],\
+           [int(amnt) for amnt in counts if amnt != 0]
+
+def count_chromosomes(dataset, rows):
     """
     Function that counts the amount of cnvs that are located in a certain chromosome
-    :param dff: pandas Dataframe that is a modified version of df as defined in the setup.
+    :param dataset: The Dataset of the table.
+    :param rows: Array of the positions of the rows of df that are counted.
     :return: a list of lists containing all names and all amounts of chromosomes that have an amount above 0.
     """
-    val_dict = {}
-    dff = dff.drop_duplicates('ID')
-    dff = dff[~dff["INFO"].str.contains("INS:DISPERSED")]
-    for chrom in unique_chromosomes:
-        val_dict[chrom] = len(dff[dff["Location"].str.contains("^{}".format(chrom))])
-    return [str(name) for name, amnt in val_dict.items() if amnt != 0],\
-           [amnt for name, amnt in val_dict.items() if amnt != 0]
+    counts = dataset.variant_index.count_chromosomes(rows)
+    return [str(name) for name, amnt in zip(dataset.unique_chromosomes, counts) if amnt != 0],\
+           [int(amnt) for amnt in counts if amnt != 0]
 
 ###################### GENERAL LOGIC FUNCTIONS #################
 
@@ -1008,6 +1329,27 @@ def get_ordered_dict(column_names, data_rows, row_names):
     return OrderedDict(ret_list)
 
 
+def display_rows(dataset, rows, whitespace=True):
+    """
+    Function that gives rows of the vep table the way they are shown and saved. Position columns that are read as
+    integers get back the - of vep where there is no position. The table itself keeps the values of the vep file for
+    filtering, the white spaces are only added to the rows that are shown.
+    :param dataset: The Dataset of the table.
+    :param rows: Array of row positions.
+    :param whitespace: Boolean telling if white spaces are added to the long columns so the dash table can multi-line
+    them.
+    :return: pandas Dataframe of the rows.
+    """
+    rows_df = dataset.df.iloc[rows]
+    display = {col_name: rows_df[col_name].astype(object).fillna("-") for col_name in vept.POSITION_COLUMNS
+               if col_name in rows_df and pd.api.types.is_integer_dtype(rows_df[col_name])}
+    if whitespace:
+        for col_name in WHITESPACE_COLUMNS:
+            if col_name in rows_df:
+                display[col_name] = rows_df[col_name].map(add_whitespace, na_action="ignore")
+    return rows_df.assign(**display)
+
+
 def add_whitespace(value):
     """
     Function that adds some white spaces to a string making sure this string can span multiple lines in datatable
@@ -1052,10 +1394,27 @@ def check_valid_p_value(n):
     except ValueError:
         return False
 
+def get_arguments():
+    """
+    Function using argparse to parse command line arguments.
+    """
+    parser = argparse.ArgumentParser(description='Dash app that visualises the vep and ontologizer results.')
+    parser.add_argument("result_dir", help="Directory with the results of annotate_cnvs.nf.")
+    parser.add_argument("--max_jobs", type=int, default=ontj.DEFAULT_MAX_JOBS,
+                        help="Amount of ontologizer runs that can run at the same time.")
+    parser.add_argument("--multi", action="store_true",
+                        help="Show all result directories below result_dir, every directory with an added_vep file "
+                             "gets its own page.")
+    parser.add_argument("--max_datasets", type=int, default=DEFAULT_MAX_DATASETS,
+                        help="Amount of result directories that stay loaded with --multi.")
+    parser.add_argument("--max_memory", type=float, default=None,
+                        help="Amount of MB the tables of the loaded result directories can use with --multi.")
+    return parser.parse_args()
+
+
 if __name__ == '__main__':
-    global result_dir
-    result_dir = argv[1]
-    if not path.exists(result_dir):
-        raise FileNotFoundError("Cannot locate directory: {}. Make sure the directory exists".format(result_dir))
-    setup()
-    app.run_server()
+    args = get_arguments()
+    if args.multi:
+        create_multi_app(args.result_dir, args.max_datasets, args.max_memory, args.max_jobs).run_server()
+    else:
+        create_app(args.result_dir, args.max_jobs).run_server()
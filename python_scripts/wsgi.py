@@ -0,0 +1,31 @@
+#!/usr/bin/env python3
+
+"""
+Author: Bram van Wersch
+University: Wageningen university
+Date: 13/06/2019
+"""
+
+# WSGI entry point of visualise_vep.py for running the dash app with multiple worker processes, for example:
+#   VEP_RESULT_DIR=name/of/output/directory gunicorn --preload --workers 4 --bind 0.0.0.0:8050 wsgi:application
+# With --preload the table is loaded once before the workers are forked, without it every worker loads the table
+# itself. In both cases the workers read the same memory mapped cache of the vep table so its pages are shared.
+# Set VEP_ROOT_DIR instead to show all result directories below a directory, like visualise_vep.py --multi, with
+# VEP_MAX_DATASETS and VEP_MAX_MEMORY for the amount of datasets and MB that stay loaded in every worker.
+
+from os import environ
+
+import ontologizer_jobs as ontj
+import visualise_vep as visv
+
+max_jobs = int(environ.get("VEP_MAX_JOBS", ontj.DEFAULT_MAX_JOBS))
+if "VEP_ROOT_DIR" in environ:
+    max_memory = float(environ["VEP_MAX_MEMORY"]) if "VEP_MAX_MEMORY" in environ else None
+    application = visv.create_multi_app(environ["VEP_ROOT_DIR"],
+                                        int(environ.get("VEP_MAX_DATASETS", visv.DEFAULT_MAX_DATASETS)),
+                                        max_memory, max_jobs).server
+elif "VEP_RESULT_DIR" in environ:
+    application = visv.create_app(environ["VEP_RESULT_DIR"], max_jobs).server
+else:
+    raise ValueError("Set VEP_RESULT_DIR to the directory with the results of annotate_cnvs.nf or VEP_ROOT_DIR to a "
+                     "directory with multiple result directories.")